@@ -6,7 +6,7 @@ from pyreverb.Exemple.shooter_objects import Player, Bullet, MAP_SIZE, TICK
 from pyreverb.reverb import *
 
 clock = pygame.time.Clock()
-reverb.VERBOSE = 2  # make it speak less
+reverb.set_verbose(1)  # make it speak less
 
 
 @client_event_registry.on_event("server_stop")
@@ -22,7 +22,8 @@ def start_client(is_host=False, port=8080, admin_key: int = 1000):
 
     ReverbManager.IS_HOST = is_host
     ReverbManager.REVERB_SIDE = ReverbSide.CLIENT
-    clt = Client(port=port)
+    local = is_host and hasattr(socket, "AF_UNIX")  # The server runs on this machine
+    clt = Client(port=port, unix_path=local_socket_path(port) if local else None)
     ReverbManager.REVERB_CONNECTION = clt
     clt.connect()
     ReverbManager.log_as_admin(admin_key)
@@ -42,7 +43,8 @@ def start_client(is_host=False, port=8080, admin_key: int = 1000):
                              Vector2(b.pos.get()) + Vector2(b.dir.get()), 1)
 
         pygame.display.flip()
-        clock.tick(TICK)
+        dt = clock.tick(TICK) / 1000
+        ReverbManager.tick(dt)  # Tick the ReverbObjects and send the inputs of this frame
 
     print("Closing the game...")
     if ReverbManager.IS_HOST:
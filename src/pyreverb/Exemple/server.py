@@ -1,14 +1,10 @@
 import socket
 import sys
 
-import pygame.time
-
 from pyreverb.Exemple.shooter_objects import Player, TICK
 from pyreverb.reverb import ReverbManager, ReverbSide, PATH_LOG
 from pyreverb.reverb_kernel import server_event_registry, Server, save_logs
 
-clock = pygame.time.Clock()
-
 
 @server_event_registry.on_event("client_connection")
 def on_connecting(clt: socket.socket, *args):
@@ -18,8 +14,8 @@ def on_connecting(clt: socket.socket, *args):
 
 @server_event_registry.on_event("client_disconnection")
 def on_disconnecting(clt: socket.socket, *args):
-    for p in ReverbManager.get_all_ro_by_type(Player):
-        if p.belonging_membership == clt.getpeername()[1]:
+    for p in ReverbManager.get_reverb_objects_by_belonging_membership(clt.getpeername()[1]):
+        if isinstance(p, Player):
             ReverbManager.remove_reverb_object(p.uid)
 
 
@@ -30,17 +26,16 @@ def start_server(port: int, admin_key: int):
     ReverbManager.REVERB_CONNECTION = serv
     ReverbManager.ADMIN_KEY = admin_key  # Set the admin key
     serv.start_server()
-    while True:
-        try:
-            clock.tick(TICK)
-            ReverbManager.server_sync()
-        except KeyboardInterrupt:
-            serv.stop_server()
-            break
-        except Exception as e:
-            print("ERROR CLOSE")
-            save_logs(PATH_LOG)
-            raise e
+    if hasattr(socket, "AF_UNIX"):
+        serv.start_local_server()  # The client of the host connects without TCP
+    try:
+        ReverbManager.run_tick_loop(TICK)  # Tick all the ReverbObjects then sync them
+    except KeyboardInterrupt:
+        serv.stop_server()
+    except Exception as e:
+        print("ERROR CLOSE")
+        save_logs(PATH_LOG)
+        raise e
 
 
 if __name__ == "__main__":
@@ -1,79 +1,78 @@
 import random
-import time
 
-import pygame.time
+import pygame
 from pygame import Vector2
 
-from pyreverb.reverb import ReverbObject, ReverbManager, SyncVar
+from pyreverb.reverb import ReverbObject, ReverbManager, SyncVar, SyncEquality, server_rpc
 
 TICK = 60
 MAP_SIZE = (800, 800)
 
-clock = pygame.time.Clock()
-
 @ReverbManager.reverb_object_attribute
 class Bullet(ReverbObject):
     def __init__(self, pos, dir, color, belonging_membership: int = None):
         print(pos, dir, color)
-        self.pos = SyncVar(pos)
-        self.dir = SyncVar(dir)
-        self.color = SyncVar(color)
+        self.pos = SyncVar(pos, equality=SyncEquality.EPSILON, epsilon=0.5)  # Half a pixel
+        self.dir = SyncVar(dir, equality=SyncEquality.SHALLOW)
+        self.color = SyncVar(color, equality=SyncEquality.IDENTITY)
         self.speed = 2
+        self.time_to_live = None
         super().__init__(self.pos, self.dir, self.color, belonging_membership=belonging_membership)
 
     def on_init_from_client(self):
         if self.is_owner():
             self.compute_server(self.die_after_time, 2)
-            self.compute_server(self.update)
 
     # SERVER SIDE
-    def die_after_time(self, t):
-        time.sleep(t)
-        ReverbManager.remove_reverb_object(self.uid)
+    @server_rpc
+    def die_after_time(self, t: float):
+        self.time_to_live = t
 
-    def update(self):
-        while self.is_alive:
-            self.pos.set(list(self.pos.get() + Vector2(self.dir.get()) * self.speed))
-            clock.tick(TICK)
+    def on_server_tick(self, dt: float):
+        self.pos.set(list(self.pos.get() + Vector2(self.dir.get()) * self.speed * dt * TICK))
+        if self.time_to_live is not None:
+            self.time_to_live -= dt
+            if self.time_to_live <= 0:
+                ReverbManager.remove_reverb_object(self.uid)
 
 
 @ReverbManager.reverb_object_attribute
 class Player(ReverbObject):
     def __init__(self, pos=[0, 0], dir=[0, 0], color="red", belonging_membership: int = None):
-        self.pos = SyncVar(pos)
-        self.dir = SyncVar(dir)
-        self.color = SyncVar(color)
+        self.pos = SyncVar(pos, equality=SyncEquality.EPSILON, epsilon=0.5)  # Half a pixel
+        self.dir = SyncVar(dir, equality=SyncEquality.SHALLOW)
+        self.color = SyncVar(color, equality=SyncEquality.IDENTITY)
+        self.shoot_cooldown = 0
         super().__init__(self.pos, self.dir, self.color, belonging_membership=belonging_membership)
 
-    def on_init_from_client(self):
-        while self.is_alive:
-            if self.is_owner():
-                keys = pygame.key.get_pressed()
-                dir = ""
-                if keys[pygame.K_z]:
-                    dir += "Z"
-                if keys[pygame.K_s]:
-                    dir += "S"
-                if keys[pygame.K_q]:
-                    dir += "Q"
-                if keys[pygame.K_d]:
-                    dir += "D"
-
-                if dir != "":
-                    self.compute_server(self.check_walk, dir)
-
-                if keys[pygame.K_SPACE]:
-                    self.compute_server(self.spawn_bullet)
-                    time.sleep(1)
-
-                clock.tick(TICK)
+    def on_client_tick(self, dt: float):
+        if self.is_owner():
+            keys = pygame.key.get_pressed()
+            dir = ""
+            if keys[pygame.K_z]:
+                dir += "Z"
+            if keys[pygame.K_s]:
+                dir += "S"
+            if keys[pygame.K_q]:
+                dir += "Q"
+            if keys[pygame.K_d]:
+                dir += "D"
+
+            if dir != "":
+                self.queue_compute_server(self.check_walk, dir, coalesce=True)
+
+            self.shoot_cooldown -= dt
+            if keys[pygame.K_SPACE] and self.shoot_cooldown <= 0:
+                self.queue_compute_server(self.spawn_bullet)
+                self.shoot_cooldown = 1
 
     @staticmethod
     def choose_rnd_color():
         return ["green", "red", "blue", "yellow"][random.randint(0, 3)]
 
     # ON SERVER
-    def check_walk(self, dir):
+    @server_rpc
+    def check_walk(self, dir: str):
         self.dir.set([0, 0])
         speed = 5
 
@@ -88,6 +87,7 @@ class Player(ReverbObject):
         if is_pos_in_map_bound(new_pos):
             self.pos.set(tuple(new_pos))
 
+    @server_rpc
     def spawn_bullet(self):
         ReverbManager.add_new_reverb_object(
             Bullet(self.pos.get(), self.dir.get(), self.color.get(), belonging_membership=self.belonging_membership))
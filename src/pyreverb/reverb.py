@@ -1,9 +1,21 @@
+import asyncio
 import atexit
+import contextvars
+import heapq
+import inspect
+import itertools
+import mmap
 import platform
 import random
 import subprocess
+import sys
+import types
 import uuid
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
 from enum import Enum
+from functools import partial
 from typing import Type, TypeVar
 
 from .reverb_errors import *
@@ -12,14 +24,42 @@ from .reverb_kernel import *
 T = TypeVar("T")
 
 VERBOSE = 2
+"""
+- 2: Full verbose (LOG_DEBUG)
+- 1: Only the connections and the life of the server and the client (LOG_INFO)
+- 0: Stop verbosing (LOG_OFF)
+- Setting reverb.VERBOSE is the same as calling set_verbose
+"""
 WORKING_DIR = os.path.dirname(os.path.abspath(__file__))
 PATH_LOG = f"{WORKING_DIR}/logs/"
 
-"""
-- 2: Full verbose
-- 1: Only some things
-- 0: Stop verbosing
-"""
+manager_log = Logger("REVERB_MANAGER", Back.YELLOW)
+object_log = Logger("REVERB_OBJECT", Back.MAGENTA)
+
+
+def set_verbose(verbose: int):
+    """
+    Set VERBOSE and the level of the logs of PyReverb (2: LOG_DEBUG, 1: LOG_INFO, 0: LOG_OFF)
+    :param verbose: 2, 1 or 0
+    """
+    global VERBOSE
+    VERBOSE = verbose
+    set_log_level(LOG_DEBUG if verbose >= 2 else LOG_INFO if verbose == 1 else LOG_OFF)
+
+
+class ReverbModule(types.ModuleType):
+    """
+    - The module reverb: an assignment to reverb.VERBOSE sets the level of the logs like set_verbose
+    """
+
+    def __setattr__(self, name, value):
+        if name == "VERBOSE":
+            set_verbose(value)
+        else:
+            super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = ReverbModule
 
 
 class ReverbSide(Enum):
@@ -27,6 +67,12 @@ class ReverbSide(Enum):
     CLIENT = 2
 
 
+class TickPhase(Enum):
+    INPUT = 1  # Tick hooks registered for the input phase
+    SIMULATE = 2  # on_server_tick/on_client_tick of all the ReverbObjects then the tick hooks of this phase
+    SYNC = 3  # Tick hooks of this phase then server_sync ('SERVER') or flush_inputs ('CLIENT')
+
+
 def start_distant(file, *args, **kwargs) -> subprocess.Popen:
     """
     Sart a process of the game with his side.
@@ -73,21 +119,87 @@ def stop_subprocess(sub: subprocess.Popen = None):
             "You try to stop the process with a None subprocess! By default the subprocess is reverb.SERVER_PROCESS, set it to the server process before run it again if args is let by default.")
 
 
+class SyncEquality(Enum):
+    VALUE = 1  # old != new (element-wise for the lists)
+    IDENTITY = 2  # old is not new: cheapest, any new object is a change
+    SHALLOW = 3  # One level: the elements of a list/tuple/dict are compared by identity
+    EPSILON = 4  # Numbers (or lists of numbers) that moved more than the epsilon since the last change
+
+
+def is_shallow_equal(old, new) -> bool:
+    """
+    :return: True if old and new are the same object or contain the same objects (one level)
+    """
+    if old is new:
+        return True
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, (list, tuple)):
+        return len(old) == len(new) and all(a is b or (not isinstance(a, (list, tuple, dict)) and a == b)
+                                            for a, b in zip(old, new))
+    if isinstance(old, dict):
+        return old.keys() == new.keys() and all(old[key] is new[key] for key in old)
+    return old == new
+
+
+def is_epsilon_equal(old, new, epsilon: float) -> bool:
+    """
+    :return: True if the numbers (or the numbers of the lists) of old and new are closer than epsilon
+    """
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)) \
+            and not isinstance(old, bool) and not isinstance(new, bool):
+        return abs(old - new) <= epsilon
+    if isinstance(old, (list, tuple)) and isinstance(new, (list, tuple)):
+        return len(old) == len(new) and all(is_epsilon_equal(a, b, epsilon) for a, b in zip(old, new))
+    return old == new
+
+
 class SyncVar:
     """
     Simple class that trigger a hook when the value changes and syncs var between all clients
+    - Each change increments its version, the server syncs the SyncVars whose version is not synced yet
     """
 
-    def __init__(self, default=None, on_changed: list[staticmethod] = None):
+    def __init__(self, default=None, on_changed: list[staticmethod] = None,
+                 equality: SyncEquality = SyncEquality.VALUE, epsilon: float = 1e-6):
         """
         :param default: The value
         :param on_changed: List of methode that will be trigger if the value that will be set changes
+        :param equality: How set() knows that the value changes (see SyncEquality)
+        :param epsilon: The smallest change of SyncEquality.EPSILON
         """
         if on_changed is None:
             on_changed = []
         self.on_changed = on_changed
         self.value = default
-        self.has_changed = False
+        self.equality = equality
+        self.epsilon = epsilon
+        self.reference = default  # SyncEquality.EPSILON: the value of the last change (small steps add up)
+        self.version = 0
+        self.synced_version = 0
+        self.owner: "ReverbObject" = None  # Set if its ReverbObject overrides on_changes (see ReverbWorld.deliver_changes)
+
+    @property
+    def has_changed(self) -> bool:
+        """
+        :return: True if the value changed since the last sync
+        """
+        return self.version != self.synced_version
+
+    @has_changed.setter
+    def has_changed(self, has_changed: bool):
+        if has_changed:
+            self.mark_dirty()
+        else:
+            self.synced_version = self.version
+
+    def mark_dirty(self):
+        """
+        - Sync the value on the next server_sync without calling set (ex: after pos.get().append(...))
+        - The on_changed methods are not called
+        """
+        self.version += 1
+        self.reference = self.value
 
     def get(self, val_if_not_found=None, get_only_if_change=False) -> object:
         """
@@ -99,19 +211,50 @@ class SyncVar:
         """
         if get_only_if_change and not self.has_changed:
             return None
-        return self.value if self.value else val_if_not_found
+        return self.value if self.value is not None else val_if_not_found
+
+    def is_equal(self, old, new) -> bool:
+        """
+        :return: True if set() sees no change between old and new with the equality of this SyncVar
+        """
+        equality = self.equality
+        if equality is SyncEquality.VALUE:
+            return old == new
+        if equality is SyncEquality.IDENTITY:
+            return old is new
+        if equality is SyncEquality.SHALLOW:
+            return is_shallow_equal(old, new)
+        return is_epsilon_equal(old, new, self.epsilon)
 
     def set(self, val):
         """
         Set a value
+        - The on_changed methods are called here, or into the next tick if ReverbManager.DEFER_CHANGES
         :param val: The value
         """
         old = self.value
         self.value = val
-        if old != val:
-            self.has_changed = True
-            for func in self.on_changed:
-                func(old, val)
+        if not self.is_equal(self.reference if self.equality is SyncEquality.EPSILON else old, val):
+            self.version += 1
+            self.reference = val
+            if self.on_changed or self.owner is not None:
+                world = get_world()
+                if world.DEFER_CHANGES:
+                    world.queue_change(self, old, val)
+                elif self.on_changed:
+                    self.notify(old, val)
+
+    def notify(self, old, new):
+        """
+        Call the on_changed methods
+        :param old: The old value
+        :param new: The new value
+        """
+        for func in self.on_changed:
+            try:
+                func(old, new)
+            except Exception as e:
+                warn(f"The on_changed {getattr(func, '__qualname__', func)} failed: {e.__class__.__name__}: {e}")
 
 
 def check_if_json_serializable(*args: SyncVar):
@@ -123,10 +266,163 @@ def check_if_json_serializable(*args: SyncVar):
                 f"The arg: {arg} is not serializable ! It has to be serializable by JSON to be agree as a reverb_args.")
 
 
+class ReverbRpc:
+    """
+    A method of a ReverbObject that can be called from the other side.
+    The table of a class is sorted by name, so both sides give the same method_id to the same method.
+    """
+    ARG_TYPES = {int: (int,), float: (float, int), str: (str,), bool: (bool,), list: (list,),
+                 tuple: (list, tuple)}  # Annotated type -> JSON types accepted for it
+
+    def __init__(self, method_id: int, func, side: ReverbSide):
+        self.method_id = method_id
+        self.func = func
+        self.name = func.__name__
+        self.side = side
+
+        # Annotated types of the args, checked on each call (JSON gives list for tuple, int for float...)
+        self.arg_types: list[type | None] = []
+        self.var_arg_type: type | None = None
+        try:
+            annotations = inspect.get_annotations(func, eval_str=True)
+        except Exception:
+            annotations = {}
+        for param in list(inspect.signature(func).parameters.values())[1:]:  # Skip self
+            arg_type = annotations.get(param.name)
+            arg_type = arg_type if arg_type in ReverbRpc.ARG_TYPES else None
+            if param.kind == inspect.Parameter.VAR_POSITIONAL:
+                self.var_arg_type = arg_type
+            elif param.kind in (inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD):
+                self.arg_types.append(arg_type)
+        self.has_arg_types = self.var_arg_type is not None or any(self.arg_types)
+
+    def decode_args(self, args: tuple | list) -> tuple | list:
+        """
+        - The args are checked against their annotations, never coerced (only int -> float and list -> tuple)
+        :param args: The args received
+        :return: The args with the annotated types, or ReverbRpcArgTypeError if one has another type
+        """
+        if not self.has_arg_types:
+            return args
+        decoded = []
+        for i, arg in enumerate(args):
+            expected = self.arg_types[i] if i < len(self.arg_types) else self.var_arg_type
+            if expected is not None and arg is not None:
+                if not isinstance(arg, ReverbRpc.ARG_TYPES[expected]) or (type(arg) is bool and expected is not bool):
+                    raise ReverbRpcArgTypeError(self.name, i, expected, arg)
+                if type(arg) is not expected:
+                    arg = expected(arg)  # int -> float, list -> tuple
+            decoded.append(arg)
+        return decoded
+
+    @staticmethod
+    def build_table(cls):
+        """
+        - Build the rpc table of a ReverbObject class (inherited rpcs included)
+        :param cls: The class
+        """
+        rpcs = []
+        for name in sorted(dir(cls)):
+            func = getattr(cls, name, None)
+            side = getattr(func, "__reverb_rpc_side__", None)
+            if side is not None:
+                rpcs.append(ReverbRpc(len(rpcs), func, side))
+        cls.REVERB_RPCS = tuple(rpcs)
+        cls.REVERB_RPC_BY_NAME = {rpc.name: rpc for rpc in rpcs}
+
+
+class ReverbCodec:
+    """
+    The encoder and the decoder of the SyncVars of a ReverbObject class, generated for its fields.
+    - The SyncVars are attributes of the instances: a codec is built per list of field names found on the instances
+    - Each instance checks its own field names once, then keeps its codec (see ReverbCodec.of)
+    """
+    MISSING = object()
+
+    def __init__(self, arg_count: int, fields: tuple[str, ...]):
+        """
+        :param arg_count: The number of reverb_args of the instances
+        :param fields: The names of the SyncVars, in the order of the instance
+        """
+        self.arg_count = arg_count
+        self.fields = tuple(fields)
+
+        encode_changed = ["def encode_changed(ro):", "    sync_vars = {}"]
+        for field in fields:
+            encode_changed += [f"    var = ro.{field}",
+                               "    if var.version != var.synced_version:",
+                               "        var.synced_version = var.version",
+                               f"        sync_vars[{field!r}] = var.value"]
+        encode_changed.append("    return sync_vars")
+        encode_all = ["def encode_all(ro):",
+                      "    return {" + ", ".join(f"{field!r}: ro.{field}.value" for field in fields) + "}"]
+        decode = ["def decode(ro, sync_vars):"]
+        for field in fields:
+            decode += [f"    value = sync_vars.get({field!r}, MISSING)",
+                       "    if value is not MISSING:",
+                       f"        ro.{field}.set(value)"]
+        if not fields:
+            decode.append("    pass")
+
+        self.source = "\n".join(encode_changed + encode_all + decode)
+        namespace = {"MISSING": ReverbCodec.MISSING}
+        exec(compile(self.source, f"<ReverbCodec {len(fields)} fields>", "exec"), namespace)
+        self.encode_changed = namespace["encode_changed"]
+        self.encode_all = namespace["encode_all"]
+        self.decode = namespace["decode"]
+
+    @staticmethod
+    def of(ro: "ReverbObject") -> "ReverbCodec | None":
+        """
+        - The field names of the instance are checked on its first use, the codec is then kept on the instance
+        :param ro: The ReverbObject
+        :return: The codec of its fields (None if they can't be generated, the generic path is used then)
+        """
+        codec = ro.__dict__.get("reverb_codec")
+        if codec is not None and codec.arg_count == len(ro.reverb_args):
+            return codec
+        names = list(ro.__dict__)[:len(ro.reverb_args)]
+        fields = tuple(name for name in names if isinstance(ro.__dict__[name], SyncVar))
+        if not all(field.isidentifier() for field in fields):
+            return None
+        cls = type(ro)
+        codecs = cls.__dict__.get("REVERB_CODECS")
+        if codecs is None:
+            codecs = {}
+            cls.REVERB_CODECS = codecs
+        codec = codecs.get(fields)
+        if codec is None:
+            codec = ReverbCodec(len(ro.reverb_args), fields)
+            codecs[fields] = codec
+        ro.reverb_codec = codec
+        return codec
+
+
+def server_rpc(func):
+    """
+    - Decorator of a ReverbObject method that can be called by a client with compute_server
+    - Executed on the 'SERVER' side
+    """
+    func.__reverb_rpc_side__ = ReverbSide.SERVER
+    return func
+
+
+def client_rpc(func):
+    """
+    - Decorator of a ReverbObject method that can be called by the server with compute_client
+    - Executed on the 'CLIENT' side
+    """
+    func.__reverb_rpc_side__ = ReverbSide.CLIENT
+    return func
+
+
 class ReverbObject:
     """
     - Base class of all object connected to the Network
     """
+    REVERB_RPCS: tuple[ReverbRpc, ...] = ()  # Rpc table by method_id, built by ReverbManager.reverb_object_attribute
+    REVERB_RPC_BY_NAME: dict[str, ReverbRpc] = {}
+    REVERB_CODECS: dict[tuple[str, ...], ReverbCodec] = {}  # Encoders/decoders of the SyncVars by field names, see ReverbCodec.of
 
     def __init__(self, *reverb_args: SyncVar, uid: str = "Unknown", belonging_membership: int = None):
         """
@@ -137,9 +433,15 @@ class ReverbObject:
         self.belonging_membership = belonging_membership
         self.reverb_args = reverb_args
         self.uid: str = uid
+        self.net_id: int = None  # Compact id given by the server, used on the wire instead of the uid
         self.is_alive = True
         self.type = self.__class__.__name__
         self.is_initialized = False
+        self.reverb_codec: ReverbCodec = None  # Set by ReverbCodec.of once the field names are checked
+        if type(self).on_changes is not ReverbObject.on_changes:
+            for arg in reverb_args:
+                if isinstance(arg, SyncVar):
+                    arg.owner = self
 
     def get_sync_vars(self, get_value=False, get_only_if_changed=True) -> dict[str, SyncVar | object]:
         """
@@ -148,18 +450,19 @@ class ReverbObject:
         :param get_only_if_changed: Get the value only if changed
         :return: A dict of all SyncVars or val of the SyncVar by their name
         """
+        if get_value:
+            codec = ReverbCodec.of(self)
+            if codec is not None:
+                return codec.encode_changed(self) if get_only_if_changed else codec.encode_all(self)
         sync_vars = {}
         for key, arg in dict(zip(list(self.__dict__.keys())[:len(self.reverb_args)],
                                  list(self.__dict__.values())[:len(self.reverb_args)])).items():
             if isinstance(arg, SyncVar):
-                val = (arg.get(get_only_if_changed) if get_value else arg)
-                if get_only_if_changed:
-                    if arg.has_changed:
-                        sync_vars[key] = val
-                else:
-                    sync_vars[key] = val
                 if get_only_if_changed:
-                    arg.has_changed = False
+                    if arg.version == arg.synced_version:
+                        continue
+                    arg.synced_version = arg.version
+                sync_vars[key] = arg.value if get_value else arg
         return sync_vars
 
     def pack(self, only_sync_vars) -> list[object]:
@@ -170,8 +473,8 @@ class ReverbObject:
         sync_vars = self.get_sync_vars(get_value=True, get_only_if_changed=only_sync_vars)
         check_if_json_serializable(*[sync_vars])
 
-        # If not init yet: send the type and the belonging_membership to construct the object -> if no sync vars pack nothing ->
-        return ([self.type, self.belonging_membership] if not only_sync_vars else []) + [sync_vars]
+        # If not init yet: send the type, the belonging_membership and the uid to construct the object -> if no sync vars pack nothing ->
+        return ([self.type, self.belonging_membership, self.uid] if not only_sync_vars else []) + [sync_vars]
 
     def sync(self, reverb_args: dict[str, SyncVar]):
         """
@@ -179,9 +482,12 @@ class ReverbObject:
         :param reverb_args: List of args to be updated
         """
         if ReverbManager.REVERB_SIDE == ReverbSide.CLIENT:
-            for key, val in reverb_args.items():
-                getattr(self, key).set(val)
-            self.reverb_args = list(reverb_args.values())
+            codec = ReverbCodec.of(self)
+            if codec is not None:
+                codec.decode(self, reverb_args)
+            else:
+                for key, val in reverb_args.items():
+                    getattr(self, key).set(val)
         else:
             raise ReverbWrongSideError(ReverbManager.REVERB_SIDE.name)
 
@@ -191,7 +497,7 @@ class ReverbObject:
         - Print a message with the ReverbObject style
         :param msg: The message
         """
-        print(f"{Back.MAGENTA + Fore.RED}[{Fore.RESET}REVERB_OBJECT{Fore.RED}]{Style.RESET_ALL} {msg}")
+        object_log.info(msg)
 
     def is_owner(self) -> bool:
         """
@@ -200,29 +506,81 @@ class ReverbObject:
         :return:
         """
         if ReverbManager.REVERB_SIDE == ReverbSide.CLIENT:
-            return ReverbManager.REVERB_CONNECTION.client.getsockname()[1] == self.belonging_membership
+            return ReverbManager.REVERB_CONNECTION.local_port == self.belonging_membership
         else:
             raise ReverbWrongSideError(ReverbManager.REVERB_SIDE)
 
+    def get_rpc(self, func, side: ReverbSide) -> ReverbRpc:
+        """
+        - Get the registered rpc of a method
+        :param func: The method reference (or its name)
+        :param side: The side where the method has to be executed
+        :return: The ReverbRpc or ReverbRpcNotRegisteredError if the method is not an rpc of this side
+        """
+        func_name = func if isinstance(func, str) else func.__name__
+        rpc = type(self).REVERB_RPC_BY_NAME.get(func_name)
+        if rpc is None or rpc.side != side:
+            raise ReverbRpcNotRegisteredError(self, func_name)
+        return rpc
+
     def compute_server(self, func, *args):
         """
         - Send a Packet to the server to compute a function server with args
         - Only on 'CLIENT' side
-        :param func: The server function reference. Has to be into the Class
+        :param func: The server function reference. Has to be into the Class and decorated with @server_rpc
         :param args: Args of the function
         """
         if self.is_alive:
-            ReverbManager.REVERB_CONNECTION.send("calling_server_computing", self.uid, func.__name__, *args)
+            rpc = self.get_rpc(func, ReverbSide.SERVER)
+            ReverbManager.REVERB_CONNECTION.send("calling_server_computing", self.net_id, rpc.method_id, *args)
+
+    def queue_compute_server(self, func, *args, coalesce=False):
+        """
+        - Like compute_server but the call is queued into the ReverbManager.INPUT_CHANNEL
+          and sent with the other calls of the frame on ReverbManager.flush_inputs()
+        - Only on 'CLIENT' side
+        :param func: The server function reference. Has to be into the Class and decorated with @server_rpc
+        :param args: Args of the function
+        :param coalesce: If True, only the latest call of this function in the frame is sent (useful for inputs)
+        """
+        if self.is_alive:
+            rpc = self.get_rpc(func, ReverbSide.SERVER)
+            ReverbManager.INPUT_CHANNEL.push(self.net_id, rpc.method_id, args, coalesce)
+
+    def request_server(self, func, *args, timeout: float = None) -> Future:
+        """
+        - Like compute_server but the server sends back the return value of the function
+        - Many requests can be in flight at the same time
+        - Only on 'CLIENT' side
+        :param func: The server function reference. Has to be into the Class and decorated with @server_rpc
+        :param args: Args of the function
+        :param timeout: Seconds before the future fails with a TimeoutError (None to wait forever)
+        :return: A Future of the return value (ReverbRpcRemoteError if the function failed on the server)
+        """
+        rpc = self.get_rpc(func, ReverbSide.SERVER)
+        if not self.is_alive:
+            future = Future()
+            future.set_exception(ReverbObjectNotFoundError(self.uid))
+            return future
+        return ReverbManager.send_request(self.net_id, rpc.method_id, args, timeout)
+
+    async def request_server_async(self, func, *args, timeout: float = None):
+        """
+        - Awaitable version of request_server for asyncio loops
+        :return: The return value of the function
+        """
+        return await asyncio.wrap_future(self.request_server(func, *args, timeout=timeout))
 
     def compute_client(self, func, *args):
         """
-        - Send a Packet to the client to compute a function client with args
+        - Send a Packet to all the clients to compute a function client with args
         - Only on 'SERVER' side
-        :param func: The client function reference. Has to be into the Class
+        :param func: The client function reference. Has to be into the Class and decorated with @client_rpc
         :param args: Args of the function
         """
         if self.is_alive:
-            ReverbManager.REVERB_CONNECTION.send("calling_client_computing", self.uid, func.__name__, *args)
+            rpc = self.get_rpc(func, ReverbSide.CLIENT)
+            ReverbManager.REVERB_CONNECTION.send_to_all("calling_client_computing", self.net_id, rpc.method_id, *args)
 
     def is_uid_init(self) -> bool:
         """
@@ -258,22 +616,622 @@ class ReverbObject:
         - Call when the object is removing from the 'SERVER' side
         """
 
+    def on_server_tick(self, dt: float):
+        """
+        - Call on 'SERVER' side
+        - Override this function
+        - Call every tick by ReverbManager.tick() (use it instead of a loop into a thread)
+        :param dt: Seconds since the last tick
+        """
+
+    def on_client_tick(self, dt: float):
+        """
+        - Call on the 'CLIENT' side
+        - Override this function
+        - Call every tick by ReverbManager.tick() (use it instead of a loop into a thread)
+        :param dt: Seconds since the last tick
+        """
+
+    def on_changes(self, changes: dict[str, tuple]):
+        """
+        - Override this function
+        - Only with ReverbManager.DEFER_CHANGES: call once per tick by ReverbManager.tick() with all the SyncVars changed
+        since the last tick (after their own on_changed)
+        :param changes: (old value before the tick, last value) by name of SyncVar
+        """
+
+    def notify_changes(self, changes: list[tuple[SyncVar, object, object]]):
+        """
+        Call on_changes with the changes of its SyncVars
+        :param changes: List of (sync_var, old, new)
+        """
+        names = {id(arg): name for name, arg in self.get_sync_vars(get_only_if_changed=False).items()}
+        try:
+            self.on_changes({names[id(sync_var)]: (old, new) for sync_var, old, new in changes if id(sync_var) in names})
+        except Exception as e:
+            warn(f"The on_changes of {self.type} {self.uid} failed: {e.__class__.__name__}: {e}")
+
     def __del__(self):
-        if VERBOSE == 2:
-            ReverbObject.print_object(f"Destroying the object {self.uid=}")
+        object_log.sampled("destroy", "Destroying the object self.uid=%r", self.uid)
+
+
+class NetIdAllocator:
+    """
+    Give compact integer ids to ReverbObjects.
+    A net_id is a slot (low bits) and a generation (high bits): when a slot is reused its generation is incremented,
+    so an old net_id never points to a new ReverbObject.
+    """
+    SLOT_BITS = 20
+    SLOT_MASK = (1 << SLOT_BITS) - 1
+
+    def __init__(self):
+        self._generations: list[int] = []
+        self._free_slots: deque[int] = deque()
+        self._lock = threading.Lock()
+
+    def allocate(self) -> int:
+        """
+        :return: A new net_id
+        """
+        with self._lock:
+            if self._free_slots:
+                slot = self._free_slots.popleft()  # Oldest freed slot first to delay the reuse as much as possible
+            else:
+                slot = len(self._generations)
+                if slot > NetIdAllocator.SLOT_MASK:
+                    raise OverflowError(f"No more net_id available! ({slot} ReverbObjects alive)")
+                self._generations.append(0)
+            return (self._generations[slot] << NetIdAllocator.SLOT_BITS) | slot
+
+    def release(self, net_id: int):
+        """
+        Free the slot of the net_id. Does nothing if the net_id is already released.
+        :param net_id: The net_id
+        """
+        slot = net_id & NetIdAllocator.SLOT_MASK
+        with self._lock:
+            if slot < len(self._generations) and self._generations[slot] == net_id >> NetIdAllocator.SLOT_BITS:
+                self._generations[slot] += 1
+                self._free_slots.append(slot)
+
+
+class ReverbObjectStore(Mapping):
+    """
+    Thread safe store of all the ReverbObjects of the ReverbManager.
+    - A read-only mapping uid -> ro, like the dict it replaces: a destroyed ro is "DESTROYED" until forget()
+    (store[uid], store.get(uid), uid in store, store.items()...). Write with add/remove.
+    - Every write is done under a lock and increments the generation
+    - snapshot() gives an immutable tuple of the alive ReverbObjects, rebuilt only when the generation changed
+    - Destroyed ReverbObjects are kept aside until forget() so late packets can still be recognized
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_uid: dict[str, ReverbObject] = {}
+        self._by_net_id: dict[int, ReverbObject] = {}
+        self._by_type: dict[type, dict[str, ReverbObject]] = {}  # Index by class (and every parent class)
+        self._by_membership: dict[int, dict[str, ReverbObject]] = {}  # Index by belonging_membership
+        self._destroyed_uids: set[str] = set()
+        self._destroyed_net_ids: set[int] = set()
+        self.generation = 0
+        self._snapshot: tuple[ReverbObject, ...] = ()
+        self._snapshot_generation = 0
+
+    def __getitem__(self, uid: str) -> ReverbObject | str:
+        ro = self._by_uid.get(uid)
+        if ro is None:
+            if uid in self._destroyed_uids:
+                return "DESTROYED"
+            raise KeyError(uid)
+        return ro
+
+    def __iter__(self):
+        with self._lock:  # A copy: the store can change while iterating
+            return iter(list(self._by_uid) + list(self._destroyed_uids))
+
+    def __len__(self):
+        return len(self._by_uid) + len(self._destroyed_uids)
+
+    def alive_count(self) -> int:
+        """
+        :return: The number of alive ros (without the destroyed uids)
+        """
+        return len(self._by_uid)
+
+    def is_stored(self, ro: ReverbObject) -> bool:
+        """
+        :return: True if this ro (not only its uid) is into the store
+        """
+        return self._by_uid.get(ro.uid) is ro
+
+    def add(self, ro: ReverbObject):
+        """
+        Add the ro into the store and its indexes
+        :param ro: The ReverbObject (its uid has to be init)
+        """
+        with self._lock:
+            self._index(ro)
+            self.generation += 1
+
+    def add_many(self, ros: list[ReverbObject]):
+        """
+        Add many ros at once (one lock and one new snapshot)
+        :param ros: The ReverbObjects (their uids have to be init)
+        """
+        with self._lock:
+            for ro in ros:
+                self._index(ro)
+            self.generation += 1
+
+    def _index(self, ro: ReverbObject):
+        self._by_uid[ro.uid] = ro
+        self._by_net_id[ro.net_id] = ro
+        for cls in type(ro).__mro__:
+            if issubclass(cls, ReverbObject):
+                self._by_type.setdefault(cls, {})[ro.uid] = ro
+        self._by_membership.setdefault(ro.belonging_membership, {})[ro.uid] = ro
+
+    def remove(self, ro: ReverbObject, keep_as_destroyed=False):
+        """
+        Remove the ro from the store and its indexes
+        :param ro: The ReverbObject
+        :param keep_as_destroyed: If True, get() will return "DESTROYED" for this ro until forget() is called
+        """
+        with self._lock:
+            self._by_uid.pop(ro.uid, None)
+            self._by_net_id.pop(ro.net_id, None)
+            for cls in type(ro).__mro__:
+                ros = self._by_type.get(cls)
+                if ros is not None:
+                    ros.pop(ro.uid, None)
+            ros = self._by_membership.get(ro.belonging_membership)
+            if ros is not None:
+                ros.pop(ro.uid, None)
+                if not ros:
+                    self._by_membership.pop(ro.belonging_membership, None)
+            if keep_as_destroyed:
+                self._destroyed_uids.add(ro.uid)
+                self._destroyed_net_ids.add(ro.net_id)
+            self.generation += 1
+
+    def forget(self, ro: ReverbObject):
+        """
+        Forget a ro previously removed with keep_as_destroyed
+        :param ro: The ReverbObject
+        """
+        with self._lock:
+            self._destroyed_uids.discard(ro.uid)
+            self._destroyed_net_ids.discard(ro.net_id)
+
+    def get(self, uid: str, default=None) -> ReverbObject | str | None:
+        """
+        :return: The ro, "DESTROYED" if it was removed with keep_as_destroyed, else default
+        """
+        ro = self._by_uid.get(uid)
+        if ro is None:
+            return "DESTROYED" if uid in self._destroyed_uids else default
+        return ro
+
+    def get_by_net_id(self, net_id: int) -> ReverbObject | str | None:
+        """
+        :return: The ro, "DESTROYED" if it was removed with keep_as_destroyed, else None
+        """
+        ro = self._by_net_id.get(net_id)
+        if ro is None and net_id in self._destroyed_net_ids:
+            return "DESTROYED"
+        return ro
+
+    def by_type(self, t: type) -> list[ReverbObject]:
+        """
+        :return: All the ros that are instances of t
+        - Only the ReverbObject classes are indexed, other types (mixins, ABCs...) are checked on each ro
+        """
+        with self._lock:
+            if isinstance(t, type) and issubclass(t, ReverbObject):
+                return list(self._by_type.get(t, {}).values())
+            return [ro for ro in self._by_uid.values() if isinstance(ro, t)]
+
+    def by_membership(self, belonging_membership: int) -> list[ReverbObject]:
+        """
+        :return: All the ros that belong to the given membership
+        """
+        with self._lock:
+            return list(self._by_membership.get(belonging_membership, {}).values())
+
+    def snapshot(self) -> tuple[ReverbObject, ...]:
+        """
+        :return: A consistent and immutable view of all the alive ros. Free when nothing was added or removed.
+        """
+        with self._lock:
+            if self._snapshot_generation != self.generation:
+                self._snapshot = tuple(self._by_net_id.values())
+                self._snapshot_generation = self.generation
+            return self._snapshot
+
+
+class ReverbInputChannel:
+    """
+    Accumulate the rpc commands of a client during a frame to send them as one batch per tick.
+    - Commands keep their order
+    - A coalesced command replaces the previous one with the same ReverbObject and method (only the latest is kept)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._commands: list[list] = []
+        self._coalesced: dict[tuple[int, int], int] = {}  # (net_id, method_id) -> index into _commands
+
+    def __len__(self):
+        return len(self._commands)
+
+    def push(self, net_id: int, method_id: int, args: tuple, coalesce=False):
+        """
+        Add a command to the current batch
+        :param net_id: The net_id of the ReverbObject
+        :param method_id: The id of the rpc
+        :param args: The args of the rpc
+        :param coalesce: If True, replace the previous command of this batch with the same net_id and method_id
+        """
+        command = [net_id, method_id, *args]
+        with self._lock:
+            if coalesce:
+                key = (net_id, method_id)
+                i = self._coalesced.get(key)
+                if i is not None:
+                    self._commands[i] = command
+                    return
+                self._coalesced[key] = len(self._commands)
+            self._commands.append(command)
+
+    def flush(self) -> list[list]:
+        """
+        :return: All the commands of the batch, and start a new batch
+        """
+        with self._lock:
+            commands = self._commands
+            self._commands = []
+            self._coalesced = {}
+        return commands
+
+
+class ReverbSnapshotFile:
+    """
+    Append-only binary file of the world of the server: a header then records (kind, length) followed by a payload.
+    - An object record is the JSON of [type, belonging_membership, uid, sync_vars], a removed record is the uid
+    - Only the ros changed since the last save are encoded and appended (seen by the versions of their SyncVars),
+    the file is rewritten when it gets too big
+    - On load, the last record of each uid wins
+    """
+    MAGIC = b"RVBSNAP\x01"
+    RECORD = struct.Struct("!BI")  # kind, length of the payload
+    OBJECT, REMOVED = 0, 1
+
+    def __init__(self, path: str):
+        """
+        :param path: The path of the snapshot file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.written: dict[str, bytes] = {}  # uid -> last payload written
+        self.states: dict[str, tuple] = {}  # uid -> state of the ro when its payload was written (see state_of)
+        self.size = 0  # Bytes of the records into the file
+        self.is_compact = False  # The first save rewrites the file
+
+    @staticmethod
+    def encode_ro(ro: ReverbObject) -> bytes:
+        sync_vars = {key: var.value for key, var in ro.get_sync_vars(get_only_if_changed=False).items()}
+        return json.dumps([ro.type, ro.belonging_membership, ro.uid, sync_vars]).encode()
+
+    @staticmethod
+    def state_of(ro: ReverbObject) -> tuple:
+        """
+        :return: Changes when the ro has to be encoded again: its identity, its membership and the versions of its SyncVars
+        """
+        args = list(ro.__dict__.values())[:len(ro.reverb_args)]
+        return id(ro), ro.belonging_membership, tuple(arg.version for arg in args if isinstance(arg, SyncVar))
+
+    def save(self, ros) -> int:
+        """
+        Write the changes of the world since the last save
+        :param ros: All the ReverbObjects of the world
+        :return: The number of records written
+        """
+        with self.lock:
+            payloads: dict[str, bytes] = {}
+            states: dict[str, tuple] = {}
+            for ro in ros:
+                state = self.state_of(ro)
+                payload = self.written.get(ro.uid) if self.states.get(ro.uid) == state else None
+                payloads[ro.uid] = payload if payload is not None else self.encode_ro(ro)  # Only the dirty ros
+                states[ro.uid] = state
+            live_size = sum(len(payload) for payload in payloads.values()) + len(payloads) * self.RECORD.size
+            if not self.is_compact or self.size > 2 * live_size + (1 << 16):
+                written = self._rewrite(payloads)
+            else:
+                records = [(self.OBJECT, payload) for uid, payload in payloads.items()
+                           if self.written.get(uid) is not payload and self.written.get(uid) != payload]
+                records += [(self.REMOVED, uid.encode()) for uid in self.written if uid not in payloads]
+                if records:
+                    with open(self.path, "ab") as f:
+                        for kind, payload in records:
+                            f.write(self.RECORD.pack(kind, len(payload)))
+                            f.write(payload)
+                            self.size += self.RECORD.size + len(payload)
+                self.written = payloads
+                written = len(records)
+            self.states = states  # Once written: a failed write encodes them again
+            return written
+
+    def _rewrite(self, payloads: dict[str, bytes]) -> int:
+        """
+        Write all the world into a new file then replace the old one (a crash keeps the old file)
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.MAGIC)
+            for payload in payloads.values():
+                f.write(self.RECORD.pack(self.OBJECT, len(payload)))
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            self.size = f.tell() - len(self.MAGIC)
+        os.replace(tmp_path, self.path)
+        self.written = payloads
+        self.is_compact = True
+        return len(payloads)
+
+    @staticmethod
+    def load(path: str) -> list[list]:
+        """
+        Read a snapshot file with a memory map
+        :param path: The path of the snapshot file
+        :return: The full packs [type, belonging_membership, uid, sync_vars] of the ros
+        """
+        ros: dict[str, list] = {}
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < len(ReverbSnapshotFile.MAGIC):
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(ReverbSnapshotFile.MAGIC)] != ReverbSnapshotFile.MAGIC:
+                    raise ValueError(f"{path} is not a PyReverb snapshot file!")
+                offset = len(ReverbSnapshotFile.MAGIC)
+                record_size = ReverbSnapshotFile.RECORD.size
+                while offset + record_size <= len(data):
+                    kind, length = ReverbSnapshotFile.RECORD.unpack_from(data, offset)
+                    offset += record_size
+                    if offset + length > len(data):
+                        warn(f"The last record of the snapshot {path} is truncated !")
+                        break
+                    payload = data[offset:offset + length]
+                    offset += length
+                    if kind == ReverbSnapshotFile.REMOVED:
+                        ros.pop(payload.decode(), None)
+                    else:
+                        ro_data = json.loads(payload)
+                        ros[ro_data[2]] = ro_data
+        return list(ros.values())
+
+
+class RequestTimeouts:
+    """
+    The timeouts of all the requests (see ReverbManager.send_request) with one thread and a heap of deadlines
+    - The thread is started by the first request with a timeout, then sleeps until the next deadline
+    - A request answered before its deadline is already out of its pending requests: its deadline does nothing
+    """
+
+    def __init__(self):
+        self.heap: list[tuple] = []  # (deadline, order, request_id, timeout, pending requests of its world)
+        self.order = itertools.count()  # The request_ids of two worlds can be equal
+        self.condition = threading.Condition()
+        self.thread: threading.Thread = None
+
+    def add(self, pending: dict[int, Future], request_id: int, timeout: float):
+        """
+        :param pending: The pending requests of the world of the request (request_id -> future)
+        :param request_id: The id of the request
+        :param timeout: Seconds before its future fails with a TimeoutError
+        """
+        with self.condition:
+            heapq.heappush(self.heap, (time.monotonic() + timeout, next(self.order), request_id, timeout, pending))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        """Thread that fails the requests whose deadline is over"""
+        while True:
+            with self.condition:
+                while not self.heap or self.heap[0][0] > time.monotonic():
+                    self.condition.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
+                _, _, request_id, timeout, pending = heapq.heappop(self.heap)
+            future = pending.pop(request_id, None)
+            if future is not None and future.set_running_or_notify_cancel():  # False if cancelled by the caller
+                future.set_exception(TimeoutError(f"No response from the server after {timeout}s ({request_id=})"))
+
+
+REQUEST_TIMEOUTS = RequestTimeouts()
+
+
+class ReverbWorld:
+    """
+    - A world: its ReverbObjects, its side, its connection and its state of tick.
+    - ReverbManager works on the current world of the thread (the default one if none is entered). The threads
+    started by a connection, and the events, keep the world where the connection was started.
+    - Many worlds can live into one process: game rooms on a server, bots for a load test...
+    - The ReverbObject classes, the handlers of server_event_registry/client_event_registry and the tick hooks are
+    shared by all the worlds. The handlers of world.server_event_registry/world.client_event_registry are only
+    triggered by the connection of this world.
+    """
+    _active = threading.local()  # Tokens of the worlds entered by each thread
+
+    def __init__(self, name: str = None):
+        """
+        :param name: The name of the world (ex: the room)
+        """
+        self.name = name
+        self.server_event_registry = EventRegistry(parent=server_event_registry)
+        self.client_event_registry = EventRegistry(parent=client_event_registry)
+        self.REVERB_SIDE: ReverbSide = None
+        self._connection: Client | Server = None
+        self.REVERB_OBJECTS = ReverbObjectStore()
+        self.INPUT_CHANNEL = ReverbInputChannel()
+        self.PENDING_REQUESTS: dict[int, Future] = {}  # request_id -> future (timeouts: REQUEST_TIMEOUTS)
+        self.REQUEST_IDS = itertools.count()
+        self.SYNC_FILTER = None  # function(clt, net_ids) -> net_ids of the changes this client receives (None: all)
+        self.DEFER_CHANGES = False  # Call the on_changed of the SyncVars (and ReverbObject.on_changes) once per tick instead of into SyncVar.set
+        self.PENDING_CHANGES: dict[SyncVar, list] = {}  # SyncVar -> [old value before the tick, last value]
+        self.CHANGES_LOCK = threading.Lock()
+        self.PENDING_HOOKS: deque = deque()
+        self.JOINING: dict[tuple[str, int], tuple[deque[int], float]] = {}  # addr -> (net_ids left, join start)
+        self.IS_TICKING = False
+        self.PROFILE_TICKS = 0  # Number of next ticks to capture with the sampling profiler
+        self.PROFILE_PATH: str = None
+        self.PROFILE_SAMPLER: SamplingProfiler = None
+        self.TICK_PROFILE: dict[str, int] = None  # Last capture of profile_next_ticks
+        self.NET_IDS = NetIdAllocator()
+        self.SNAPSHOT: ReverbSnapshotFile = None  # The file of save_snapshot
+        self.ADMIN_KEY = random.randint(1000, 10000)
+        self.ADMINS = []
+        self.SERVER_METRICS: dict = None  # Last metrics received with request_metrics_admin
+
+    @property
+    def REVERB_CONNECTION(self) -> Client | Server:
+        return self._connection
+
+    @REVERB_CONNECTION.setter
+    def REVERB_CONNECTION(self, connection: Client | Server):
+        """
+        The connection triggers the events into the registries of this world
+        """
+        self._connection = connection
+        if isinstance(connection, Server):
+            connection.event_registry = self.server_event_registry
+        elif isinstance(connection, Client):
+            connection.event_registry = self.client_event_registry
+
+    def queue_change(self, sync_var: SyncVar, old, new):
+        """
+        Keep the change of a SyncVar until deliver_changes: only the first old value and the last value are kept
+        """
+        with self.CHANGES_LOCK:
+            change = self.PENDING_CHANGES.get(sync_var)
+            if change is None:
+                self.PENDING_CHANGES[sync_var] = [old, new]
+            else:
+                change[1] = new
+
+    def deliver_changes(self) -> int:
+        """
+        Call the on_changed of the SyncVars changed since the last delivery, once per SyncVar, with the old value
+        before the first change and the last value (nothing if the value came back to the old one, with the
+        SyncEquality of the SyncVar)
+        - Then the on_changes of their ReverbObjects, once per object with all its changes
+        :return: The number of SyncVars notified
+        """
+        with self.CHANGES_LOCK:
+            if not self.PENDING_CHANGES:
+                return 0
+            changes, self.PENDING_CHANGES = self.PENDING_CHANGES, {}
+        delivered = 0
+        by_owner: dict[ReverbObject, list] = {}
+        for sync_var, (old, new) in changes.items():
+            if not sync_var.is_equal(old, new):  # Same policy as an immediate set()
+                sync_var.notify(old, new)
+                if sync_var.owner is not None:
+                    by_owner.setdefault(sync_var.owner, []).append((sync_var, old, new))
+                delivered += 1
+        for ro, ro_changes in by_owner.items():
+            ro.notify_changes(ro_changes)
+        return delivered
+
+    def __enter__(self):
+        """
+        Make this world the current one of the thread (and of the threads it starts)
+        """
+        if not hasattr(ReverbWorld._active, "tokens"):
+            ReverbWorld._active.tokens = []
+        ReverbWorld._active.tokens.append(CURRENT_WORLD.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        CURRENT_WORLD.reset(ReverbWorld._active.tokens.pop())
+
+    def run(self, func, *args, **kwargs):
+        """
+        Call a function into this world
+        :return: The return value of the function
+        """
+        with self:
+            return func(*args, **kwargs)
 
+    def tick(self, dt: float):
+        """
+        ReverbManager.tick into this world
+        """
+        with self:
+            ReverbManager.tick(dt)
+
+    def run_tick_loop(self, tick_rate: int = 60):
+        """
+        ReverbManager.run_tick_loop into this world (blocking, stop it with stop_tick_loop)
+        """
+        with self:
+            ReverbManager.run_tick_loop(tick_rate)
+
+    def stop_tick_loop(self):
+        self.IS_TICKING = False
+
+    def __repr__(self):
+        return f"ReverbWorld({self.name!r}, side={self.REVERB_SIDE}, ros={self.REVERB_OBJECTS.alive_count()})"
+
+
+WORLD_STATE = frozenset(name for name in vars(ReverbWorld(None)) if name.isupper()) | {"REVERB_CONNECTION"}
+CURRENT_WORLD: contextvars.ContextVar[ReverbWorld] = contextvars.ContextVar("reverb_world")
+DEFAULT_WORLD = ReverbWorld("default")
+
+
+def get_world() -> ReverbWorld:
+    """
+    :return: The current world of the thread
+    """
+    return CURRENT_WORLD.get(DEFAULT_WORLD)
 
-class ReverbManager:
+
+class ReverbManagerMeta(type):
+    """
+    Give the state of the current ReverbWorld as class attributes of ReverbManager
+    (ex: ReverbManager.REVERB_OBJECTS is the store of the current world)
+    """
+
+    def __getattr__(cls, name):
+        if name in WORLD_STATE:
+            return getattr(get_world(), name)
+        raise AttributeError(f"type object '{cls.__name__}' has no attribute '{name}'")
+
+    def __setattr__(cls, name, value):
+        if name in WORLD_STATE:
+            setattr(get_world(), name, value)
+        else:
+            super().__setattr__(name, value)
+
+
+class ReverbManager(metaclass=ReverbManagerMeta):
     """
     - This class is static!
     - It links ReverbObject to the reference of the ReverbObject!
+    - Its state (REVERB_SIDE, REVERB_CONNECTION, REVERB_OBJECTS...) is the one of the current ReverbWorld
     """
-    REVERB_SIDE: ReverbSide = None
-    REVERB_CONNECTION: Client | Server = None  # Client, or Server
-    REVERB_OBJECTS: dict[str, ReverbObject] = {}
+    TICK_HOOKS: dict[TickPhase, list] = {phase: [] for phase in TickPhase}  # Shared by all the worlds
+    SYNC_ENCODER_POOL: FrameEncoderPool = None  # Encode the filtered syncs of the clients into worker processes
+    HOOKS_ON_TICK = False  # 'CLIENT' side: run on_init/destroy_from_client into tick() instead of the HOOK_POOL
+    HOOKS_PER_TICK = 256  # Max hooks run by one tick() when HOOKS_ON_TICK
+    HOOK_WORKERS = 4
+    HOOK_POOL: ThreadPoolExecutor = None
+    JOIN_CHUNK_SIZE = 64  # Number of ros sent per tick to a client that joins
+    JOIN_PRIORITY = None  # function(clt, ro) -> sort key of the ros sent to a joining client, the smallest first
     REVERB_OBJECT_REGISTRY = {"ReverbObject": ReverbObject}  # Register all type
-    ADMIN_KEY = random.randint(1000, 10000)
-    ADMINS = []
 
     try:
         IS_HOST = sys.argv[2] == "1"
@@ -287,8 +1245,7 @@ class ReverbManager:
         - Print a message with the ReverbManager style
         :param msg: The message
         """
-        if VERBOSE != 0:
-            print(f"{Back.YELLOW + Fore.RED}[{Fore.RESET}REVERB_MANAGER{Fore.RED}]{Style.RESET_ALL} {msg}")
+        manager_log.info(msg)
 
     @staticmethod
     def add_type_if_dont_exit(ro: type[ReverbObject]):
@@ -296,19 +1253,14 @@ class ReverbManager:
             ReverbManager.REVERB_OBJECT_REGISTRY[ro.__name__]
         except KeyError:
             ReverbManager.REVERB_OBJECT_REGISTRY[ro.__name__] = ro
-            if VERBOSE >= 1:
-                ReverbManager.print_manager(f"Adding type '{ro.__name__}' to the registry.")
+            manager_log.info("Adding type '%s' to the registry.", ro.__name__)
 
     @staticmethod
     def get_reverb_objects_by_belonging_membership(belonging_membership: int) -> list[ReverbObject]:
         """
         :return: List of all ROs that belong to the client with the given membership
         """
-        ro_lst = []
-        for ro in ReverbManager.REVERB_OBJECTS.values():
-            ro_lst.append(ro) if ro.belonging_membership == belonging_membership else None
-
-        return ro_lst
+        return ReverbManager.REVERB_OBJECTS.by_membership(belonging_membership)
 
     @staticmethod
     def ros_to_uids(ros: list[ReverbObject]) -> list[str]:
@@ -358,6 +1310,35 @@ class ReverbManager:
         else:
             raise ReverbWrongSideError(ReverbSide.CLIENT)
 
+    @staticmethod
+    def request_metrics_admin():
+        """
+        - Call on the 'CLIENT' side
+        - Ask the metrics of the server. Only answered if the client is registered as an admin.
+        - The response triggers 'metrics_admin_response', the last one is stored into ReverbManager.SERVER_METRICS
+        """
+        if ReverbManager.REVERB_SIDE == ReverbSide.CLIENT:
+            ReverbManager.REVERB_CONNECTION.send("metrics_admin")
+        else:
+            raise ReverbWrongSideError(ReverbSide.CLIENT)
+
+    @staticmethod
+    @server_event_registry.on_event("metrics_admin")
+    def on_metrics_admin(clt: socket.socket, *args):
+        """
+        - Call on the 'SERVER' side
+        - Send the metrics snapshot to an admin
+        """
+        if clt in ReverbManager.ADMINS:
+            ReverbManager.REVERB_CONNECTION.send_to(clt, "metrics_admin_response", metrics.snapshot())
+        else:
+            ReverbManager.print_manager("A user tried to get the metrics without admin rights!")
+
+    @staticmethod
+    @client_event_registry.on_event("metrics_admin_response")
+    def on_metrics_admin_response(clt: socket.socket, snapshot: dict, *args):
+        ReverbManager.SERVER_METRICS = snapshot
+
     @staticmethod
     @server_event_registry.on_event("grant_admin")
     def on_grant_admin(clt: socket.socket, key):
@@ -384,6 +1365,131 @@ class ReverbManager:
         elif response == "REFUSED":
             ReverbManager.print_manager(f"The server refused the admin right to you! (Wrong key or already admin)")
 
+    @staticmethod
+    def on_tick(phase: TickPhase):
+        """
+        - Decorator of a function called every tick during the given phase
+        :param phase: The TickPhase
+        :return: The decorator
+        """
+
+        def decorator(func):
+            ReverbManager.TICK_HOOKS[phase].append(func)
+            return func
+
+        return decorator
+
+    @staticmethod
+    def tick(dt: float):
+        """
+        - Call once per frame (or use run_tick_loop)
+        - Run the INPUT, SIMULATE and SYNC phases: the tick hooks of all the ReverbObjects are called here
+        :param dt: Seconds since the last tick
+        """
+        if ReverbManager.PROFILE_TICKS:
+            sampler = ReverbManager.PROFILE_SAMPLER  # The samples are added tick after tick
+            sampler.start()
+            try:
+                ReverbManager._tick(dt)
+            finally:
+                samples = sampler.stop()
+                ReverbManager.PROFILE_TICKS -= 1
+                if not ReverbManager.PROFILE_TICKS:
+                    ReverbManager.TICK_PROFILE = samples
+                    if ReverbManager.PROFILE_PATH:
+                        sampler.dump(ReverbManager.PROFILE_PATH)
+            return
+        ReverbManager._tick(dt)
+
+    @staticmethod
+    def _tick(dt: float):
+        pending = ReverbManager.PENDING_HOOKS
+        for _ in range(min(len(pending), ReverbManager.HOOKS_PER_TICK)):
+            ReverbManager.run_hook(pending.popleft())
+        ReverbManager.deliver_changes()
+        for hook in ReverbManager.TICK_HOOKS[TickPhase.INPUT]:
+            hook(dt)
+
+        is_server = ReverbManager.REVERB_SIDE == ReverbSide.SERVER
+        for ro in ReverbManager.REVERB_OBJECTS.snapshot():
+            if ro.is_alive:
+                try:
+                    if is_server:
+                        ro.on_server_tick(dt)
+                    else:
+                        ro.on_client_tick(dt)
+                except Exception as e:
+                    warn(f"The tick of the ReverbObject '{ro.type}' with uid={ro.uid} failed: {e.__class__.__name__}: {e}")
+        for hook in ReverbManager.TICK_HOOKS[TickPhase.SIMULATE]:
+            hook(dt)
+
+        for hook in ReverbManager.TICK_HOOKS[TickPhase.SYNC]:
+            hook(dt)
+        if is_server:
+            ReverbManager.server_sync()
+        else:
+            ReverbManager.flush_inputs()
+
+    @staticmethod
+    def deliver_changes() -> int:
+        """
+        - Call the on_changed of the SyncVars changed since the last delivery (only with ReverbManager.DEFER_CHANGES)
+        - Already called at the beginning of each tick(): call it only if you don't use tick()
+        :return: The number of SyncVars notified
+        """
+        return get_world().deliver_changes()
+
+    @staticmethod
+    def run_tick_loop(tick_rate: int = 60):
+        """
+        - Blocking loop that calls tick() tick_rate times per second until stop_tick_loop()
+        :param tick_rate: Ticks per second
+        """
+        ReverbManager.IS_TICKING = True
+        period = 1 / tick_rate
+        last = next_tick = time.perf_counter()
+        while ReverbManager.IS_TICKING:
+            now = time.perf_counter()
+            ReverbManager.tick(now - last)
+            last = now
+
+            next_tick += period
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()  # Too late, don't try to catch up
+
+    @staticmethod
+    def get_rtt(clt: socket.socket = None) -> float | None:
+        """
+        - The smoothed round trip time measured by the heartbeat (ex: for an interpolation delay)
+        :param clt: 'SERVER' side: the socket of the client. Not used on the 'CLIENT' side.
+        :return: The RTT in seconds (None before the first measure)
+        """
+        if ReverbManager.REVERB_SIDE == ReverbSide.SERVER:
+            return ReverbManager.REVERB_CONNECTION.get_rtt(clt.getpeername())
+        return ReverbManager.REVERB_CONNECTION.rtt
+
+    @staticmethod
+    def profile_next_ticks(count: int = 1, path: str = None):
+        """
+        - Capture the next ticks with a sampling profiler (all the threads, including the rpcs and events handlers)
+        - The samples of the captured ticks are stored into ReverbManager.TICK_PROFILE after the last one
+        :param count: The number of ticks to capture
+        :param path: Write the samples there (collapsed format of the flame graph tools)
+        """
+        ReverbManager.PROFILE_SAMPLER = SamplingProfiler()
+        ReverbManager.PROFILE_PATH = path
+        ReverbManager.PROFILE_TICKS = count
+
+    @staticmethod
+    def stop_tick_loop():
+        """
+        - Stop the loop of run_tick_loop
+        """
+        ReverbManager.IS_TICKING = False
+
     @staticmethod
     def server_sync():
         """
@@ -391,36 +1497,104 @@ class ReverbManager:
         - Sync value from 'SERVER' to 'CLIENT' side
         """
         if ReverbManager.REVERB_SIDE == ReverbSide.SERVER:
+            start = time.perf_counter()
             ros = {}
+            spawned = set()
             does_something_changed = False
-            # Avoiding: "RuntimeError: dictionary changed size during iteration"
-            for uid, ro in list(ReverbManager.REVERB_OBJECTS.items()):
-                if ro != "DESTROYED":
-                    pack = ro.pack(only_sync_vars=ro.is_initialized)
-                    if pack and pack != [{}]:
-                        ros[uid] = pack
-                        does_something_changed = True
-                    if not ro.is_initialized:
-                        ro.is_initialized = True
+            for ro in ReverbManager.REVERB_OBJECTS.snapshot():
+                pack = ro.pack(only_sync_vars=ro.is_initialized)
+                if pack and pack != [{}]:
+                    ros[ro.net_id] = pack
+                    does_something_changed = True
+                if not ro.is_initialized:
+                    ro.is_initialized = True
+                    spawned.add(ro.net_id)
             if does_something_changed:
-                ReverbManager.REVERB_CONNECTION.send_to_all("server_sync", ros)
+                if ReverbManager.SYNC_FILTER is None:
+                    ReverbManager.REVERB_CONNECTION.send_to_all("server_sync", ros)
+                else:
+                    ReverbManager.send_filtered_sync(ros, spawned)
+            if ReverbManager.JOINING:
+                ReverbManager.stream_joins()
+            metrics.observe("server_sync_duration", time.perf_counter() - start)
+            metrics.gauge("ros", ReverbManager.REVERB_OBJECTS.alive_count())
+            metrics.gauge("ros_synced", len(ros))
         else:
             raise ReverbWrongSideError(ReverbManager.REVERB_SIDE)
 
+    @staticmethod
+    def send_filtered_sync(ros: dict[int, list], spawned: set[int]):
+        """
+        - Call on 'SERVER' side by server_sync when a SYNC_FILTER is set
+        - Each client receives only the changes given by the SYNC_FILTER (new ros are always sent)
+        - The payloads are encoded into the SYNC_ENCODER_POOL if set
+        :param ros: The changes of this tick by net_id
+        :param spawned: The net_ids of the new ros
+        """
+        clients = list(ReverbManager.REVERB_CONNECTION.clients.values())
+        groups = []
+        for clt in clients:
+            net_ids = set(ReverbManager.SYNC_FILTER(clt, ros.keys())) | spawned
+            groups.append([net_id for net_id in ros if net_id in net_ids])
+
+        if ReverbManager.SYNC_ENCODER_POOL is not None:
+            frames = ReverbManager.SYNC_ENCODER_POOL.encode("server_sync", ros, groups)
+        else:
+            frames = [Packet.create_frame("server_sync", {net_id: ros[net_id] for net_id in group}) for group in groups]
+        for clt, group, frame in zip(clients, groups, frames):
+            if group:
+                ReverbManager.REVERB_CONNECTION.send_frame(clt, frame, "server_sync")
+
     @staticmethod
     @server_event_registry.on_event("client_connection")
     def on_client_connect(clt: socket.socket, *args):
         """
         - 'Server' side
-         - Spawn existent ro on the new client!
+        - Spawn existent ro on the new client! They are streamed by server_sync, JOIN_CHUNK_SIZE ros per tick, the ros
+        of the client first (or sorted by JOIN_PRIORITY)
         """
-        ros = {}
-        for uid, ro in list(ReverbManager.REVERB_OBJECTS.items()):
-            if ro != "DESTROYED":
-                pack = ro.pack(only_sync_vars=False)
-                if pack:
-                    ros[uid] = pack
-        ReverbManager.REVERB_CONNECTION.send_to(clt, "server_sync", ros)
+        port = clt.getpeername()[1]
+        priority = ReverbManager.JOIN_PRIORITY or (lambda c, ro: ro.belonging_membership != port)
+        ros = [ro for ro in ReverbManager.REVERB_OBJECTS.snapshot() if ro.is_initialized]  # Else spawned by the sync
+        ros.sort(key=lambda ro: priority(clt, ro))
+        ReverbManager.JOINING[clt.getpeername()] = (deque(ro.net_id for ro in ros), time.perf_counter())
+
+    @staticmethod
+    @server_event_registry.on_event("client_disconnection")
+    def on_client_disconnect_joining(clt: socket.socket, *args):
+        ReverbManager.JOINING.pop(clt.getpeername(), None)
+
+    @staticmethod
+    def stream_joins():
+        """
+        - Call on 'SERVER' side by server_sync, after the changes of the tick
+        - Send the next chunk of the world to each joining client, then 'join_complete' when all is sent
+        - The changes of the ros not received yet are ignored by the client: the chunks have the current state
+        """
+        clients = ReverbManager.REVERB_CONNECTION.clients
+        for addr, (net_ids, join_start) in list(ReverbManager.JOINING.items()):
+            clt = clients.get(addr)
+            if clt is None:  # Not added yet (ex: a handoff)
+                continue
+            ros = {}
+            while net_ids and len(ros) < ReverbManager.JOIN_CHUNK_SIZE:
+                ro = ReverbManager.REVERB_OBJECTS.get_by_net_id(net_ids.popleft())
+                if ro is not None and ro != "DESTROYED":
+                    ros[ro.net_id] = ro.pack(only_sync_vars=False)
+            if ros:
+                ReverbManager.REVERB_CONNECTION.send_to(clt, "server_sync", ros)
+            if not net_ids:
+                ReverbManager.JOINING.pop(addr, None)
+                ReverbManager.REVERB_CONNECTION.send_to(clt, "join_complete")
+                metrics.observe("join_duration", time.perf_counter() - join_start)
+
+    @staticmethod
+    @client_event_registry.on_event("join_complete")
+    def on_join_complete(clt: socket.socket, *args):
+        """
+        - Called on the 'Client' side when all the world is received
+        """
+        manager_log.debug("World received: %s ReverbObjects !", ReverbManager.REVERB_OBJECTS.alive_count())
 
     @staticmethod
     def get_reverb_object(uid: str) -> ReverbObject:
@@ -429,10 +1603,22 @@ class ReverbManager:
         :param uid: The uid
         :return: ReverbObject or ReverbObjectNotFoundError if not found
         """
-        try:
-            return ReverbManager.REVERB_OBJECTS[uid]
-        except KeyError:
+        ro = ReverbManager.REVERB_OBJECTS.get(uid)
+        if ro is None:
             raise ReverbObjectNotFoundError(uid)
+        return ro
+
+    @staticmethod
+    def get_reverb_object_by_net_id(net_id: int) -> ReverbObject:
+        """
+        - Get the reverb object by net_id
+        :param net_id: The net_id
+        :return: ReverbObject or ReverbNetIdNotFoundError if not found
+        """
+        ro = ReverbManager.REVERB_OBJECTS.get_by_net_id(net_id)
+        if ro is None:
+            raise ReverbNetIdNotFoundError(net_id)
+        return ro
 
     @staticmethod
     def get_cls_by_type_name(t: str):
@@ -441,6 +1627,74 @@ class ReverbManager:
         except KeyError:
             raise ReverbTypeNotFoundError(t)
 
+    @staticmethod
+    def adopt_reverb_object(ro_data: list) -> ReverbObject:
+        """
+        - Call on 'SERVER' side
+        - Construct and add a ro that keeps its uid (ex: from a snapshot or another shard)
+        :param ro_data: The full pack of the ro [type, belonging_membership, uid, sync_vars]
+        :return: The ro
+        """
+        t, belonging_membership, uid, sync_vars = ro_data
+        ro = ReverbManager.get_cls_by_type_name(t)(*sync_vars.values(), belonging_membership=belonging_membership)
+        ro.uid = uid
+        ReverbManager.add_new_reverb_object(ro, keep_uid=True)
+        return ro
+
+    @staticmethod
+    def save_snapshot(path: str) -> int:
+        """
+        - Call on 'SERVER' side
+        - Save the world (types, uids, belonging_memberships and SyncVars of the ros) into a snapshot file.
+        Only the ros changed since the last save into the same file are written.
+        :param path: The path of the snapshot file
+        :return: The number of records written
+        """
+        if ReverbManager.REVERB_SIDE != ReverbSide.SERVER:
+            raise ReverbWrongSideError(ReverbSide.SERVER)
+        if ReverbManager.SNAPSHOT is None or ReverbManager.SNAPSHOT.path != path:
+            ReverbManager.SNAPSHOT = ReverbSnapshotFile(path)
+        return ReverbManager.SNAPSHOT.save(ReverbManager.REVERB_OBJECTS.snapshot())
+
+    @staticmethod
+    def start_periodic_snapshot(path: str, interval: float = 30):
+        """
+        - Call on 'SERVER' side
+        - Start a thread that calls save_snapshot every interval seconds (the tick is not blocked)
+        :param path: The path of the snapshot file
+        :param interval: Seconds between two saves
+        """
+
+        def loop():
+            while ReverbManager.REVERB_SIDE == ReverbSide.SERVER:
+                time.sleep(interval)
+                try:
+                    ReverbManager.save_snapshot(path)
+                except Exception as e:
+                    warn(f"The snapshot of the world failed: {e.__class__.__name__}: {e}")
+
+        spawn_thread(loop)
+
+    @staticmethod
+    def load_snapshot(path: str) -> list[ReverbObject]:
+        """
+        - Call on 'SERVER' side, before the clients connect
+        - Restore the ros of a snapshot file with their uids (on_init_from_server is called)
+        - The belonging_memberships are the ports of the old connections: give the ros back to the clients that rejoin
+        :param path: The path of the snapshot file
+        :return: The restored ros
+        """
+        if ReverbManager.REVERB_SIDE != ReverbSide.SERVER:
+            raise ReverbWrongSideError(ReverbSide.SERVER)
+        ros = []
+        for ro_data in ReverbSnapshotFile.load(path):
+            if ReverbManager.REVERB_OBJECTS.get(ro_data[2]) is not None:
+                warn(f"The ro with uid={ro_data[2]} of the snapshot already exists !")
+                continue
+            ros.append(ReverbManager.adopt_reverb_object(ro_data))
+        ReverbManager.print_manager(f"{len(ros)} ReverbObjects restored from the snapshot {path} !")
+        return ros
+
     @staticmethod
     def get_all_ro_by_type(t: Type[T]) -> list[T]:
         """
@@ -448,42 +1702,38 @@ class ReverbManager:
         :param t: Type of ReverbObject
         :return: Return the list of all found same types into the ReverbManager
         """
-        ros = []
-        for uid, ro in ReverbManager.REVERB_OBJECTS.items():
-            if ro != "DESTROYED":
-                if isinstance(ro, t):
-                    ros.append(ro)
-        return ros
+        return ReverbManager.REVERB_OBJECTS.by_type(t)
 
     @staticmethod
-    def add_new_reverb_object(ro: ReverbObject):
+    def add_new_reverb_object(ro: ReverbObject, keep_uid=False):
         """
         - Add a new ReverbObject to the ReverbManager
         :param ro: The ReverbObject
+        :param keep_uid: 'SERVER' side only, keep the uid already given to the ro (ex: a ro coming from another shard)
         """
-        if ro not in ReverbManager.REVERB_OBJECTS.values():  # Check if the
+        if not ReverbManager.REVERB_OBJECTS.is_stored(ro):  # Check if the ro is not already added
             if ReverbManager.REVERB_SIDE == ReverbSide.SERVER:  # check RM side
-                if not ro.is_uid_init():  # Check if the RO is not init yet
+                if not ro.is_uid_init() or keep_uid:  # Check if the RO is not init yet
                     # SERVER
-                    uid = str(uuid.uuid4())
-                    ReverbManager.REVERB_OBJECTS[uid] = ro
-                    ro.uid = uid
-                    threading.Thread(target=ro.on_init_from_server, daemon=True).start()
+                    if not keep_uid:
+                        ro.uid = str(uuid.uuid4())
+                    ro.net_id = ReverbManager.NET_IDS.allocate()
+                    ReverbManager.REVERB_OBJECTS.add(ro)
+                    spawn_thread(ro.on_init_from_server)
                 else:
                     raise ReverbUIDAlreadyInitError(ro, ro.uid)
             else:
                 # CLIENT
                 if ro.is_uid_init():
-                    ReverbManager.REVERB_OBJECTS[ro.uid] = ro
+                    ReverbManager.REVERB_OBJECTS.add(ro)
                     ro.is_initialized = True
                 else:
                     raise ReverbUIDUnknownError()
-                threading.Thread(target=ro.on_init_from_client, daemon=True).start()
+                ReverbManager.queue_client_hook(ro.on_init_from_client)
         else:
             raise ReverbObjectAlreadyExistError(ro)
-        if VERBOSE == 2:
-            ReverbManager.print_manager(
-                f"New ReverbObject: {ro} add into '{ReverbManager.REVERB_SIDE.name}' side with uid={ro.uid}")
+        manager_log.sampled("spawn", "New ReverbObject: %s add into '%s' side with uid=%s", ro,
+                            ReverbManager.REVERB_SIDE.name, ro.uid)
 
     @staticmethod
     def remove_reverb_object(uid: str):
@@ -497,35 +1747,78 @@ class ReverbManager:
                 ro: ReverbObject = ReverbManager.get_reverb_object(uid)
                 ro.is_alive = False
 
-                threading.Thread(target=ro.on_destroy_from_server, daemon=True).start()
-                ReverbManager.REVERB_OBJECTS[uid] = "DESTROYED"
-                f = lambda: (time.sleep(3), ReverbManager.REVERB_OBJECTS.pop(
-                    uid))  # Remove the ro 3 sec after on the server to avoid syncing bugs
-                threading.Thread(target=f, daemon=True).start()
+                spawn_thread(ro.on_destroy_from_server)
+                ReverbManager.REVERB_OBJECTS.remove(ro, keep_as_destroyed=True)
+
+                def f():  # Forget the ro 3 sec after on the server to avoid syncing bugs
+                    time.sleep(3)
+                    ReverbManager.REVERB_OBJECTS.forget(ro)
+                    ReverbManager.NET_IDS.release(ro.net_id)
+
+                spawn_thread(f)
             except KeyError:
                 raise KeyError(f"The {uid=} is not found !")
 
-            ReverbManager.REVERB_CONNECTION.send_to_all("remove_ro", uid)
+            ReverbManager.REVERB_CONNECTION.send_to_all("remove_ro", ro.net_id)
         else:
             raise ReverbWrongSideError(ReverbManager.REVERB_SIDE)
 
     @staticmethod
     @client_event_registry.on_event("remove_ro")
-    def on_server_remove_reverb_object(clt: socket.socket, uid, *args):
+    def on_server_remove_reverb_object(clt: socket.socket, net_id: int, *args):
         """
         - Only call on 'CLIENT' side
         - Remove the object
         :param clt: The socket
-        :param uid: The uid of the ReverbObject to delete
+        :param net_id: The net_id of the ReverbObject to delete
         """
         if ReverbManager.REVERB_SIDE == ReverbSide.CLIENT:
-            ro: ReverbObject = ReverbManager.get_reverb_object(uid)
+            try:
+                ro: ReverbObject = ReverbManager.get_reverb_object_by_net_id(net_id)
+            except ReverbObjectNotFoundError:
+                return  # Not received yet by a joining client
             ro.is_alive = False
-            ReverbManager.REVERB_OBJECTS.pop(uid)
-            threading.Thread(target=ro.on_destroy_from_client(), daemon=True).start()
+            ReverbManager.REVERB_OBJECTS.remove(ro)
+            ReverbManager.queue_client_hook(ro.on_destroy_from_client)
         else:
             raise ReverbWrongSideError(ReverbManager.REVERB_SIDE)
 
+    @staticmethod
+    def queue_client_hook(hook):
+        """
+        - Call on 'CLIENT' side
+        - Run a hook of a ReverbObject (ex: on_init_from_client) on the HOOK_POOL, or into the next tick() if
+        HOOKS_ON_TICK. The hooks must not block: use on_client_tick for the work of each frame.
+        :param hook: The bound method
+        """
+        if ReverbManager.HOOKS_ON_TICK:
+            ReverbManager.PENDING_HOOKS.append(hook)
+        else:
+            if ReverbManager.HOOK_POOL is None:
+                ReverbManager.HOOK_POOL = ThreadPoolExecutor(ReverbManager.HOOK_WORKERS, thread_name_prefix="reverb-hook")
+            ReverbManager.HOOK_POOL.submit(contextvars.copy_context().run, ReverbManager.run_hook, hook)
+
+    @staticmethod
+    def run_hook(hook):
+        try:
+            hook()
+        except Exception as e:
+            warn(f"The hook {hook.__qualname__} failed: {e.__class__.__name__}: {e}")
+
+    @staticmethod
+    @client_event_registry.on_event("handoff")
+    def on_handoff(clt: socket.socket, *args):
+        """
+        - Called on the 'Client' side
+        - The server gives this connection to another server process (shard): clear the world and acknowledge,
+          the new server sends its own world just after
+        """
+        for ro in ReverbManager.REVERB_OBJECTS.snapshot():
+            ro.is_alive = False
+            ReverbManager.REVERB_OBJECTS.remove(ro)
+            ReverbManager.queue_client_hook(ro.on_destroy_from_client)
+        ReverbManager.REVERB_CONNECTION.send("handoff_ack")
+
     @staticmethod
     @client_event_registry.on_event("server_sync")
     def on_server_sync(clt: socket.socket, ros: dict[str, list[int | str | dict[str, object]]], *args):
@@ -533,89 +1826,254 @@ class ReverbManager:
         - Called on the 'Client' side
         - Called when the server syncs the state of ReverbObject with clients
         :param clt: The client socket
-        :param ros: Dict[uids: list[list(values)]]
+        :param ros: Dict[net_ids: list[list(values)]]
         """
-        for uid, ro_data in ros.items():
+        new_ros = []
+        for net_id, ro_data in ros.items():
+            net_id = int(net_id)  # JSON keys are always str
 
-            ro: ReverbObject = None
+            ro = ReverbManager.REVERB_OBJECTS.get_by_net_id(net_id)
+            if ro == "DESTROYED":
+                continue
+            if ro is not None:
+                ro.sync(ro_data[-1])  # The sync vars are always the last element (even for a full pack)
+                continue
 
-            try:  # try to get a reverb_object
-                ro = ReverbManager.get_reverb_object(uid)
-                ro_data = ro_data[0]
-            except ReverbObjectNotFoundError:  # create a new one
-                t: str = ro_data[0]  # Type
-                cls = ReverbManager.get_cls_by_type_name(t)  # Class
-                args = list(ro_data[2].values())  # arguments
+            if len(ro_data) == 1:
+                continue  # Only the changes of a ro this client doesn't know (ex: removed just before)
+            t: str = ro_data[0]  # Type
+            cls = ReverbManager.get_cls_by_type_name(t)  # Class
+            args = list(ro_data[3].values())  # arguments
 
-                try:
-                    ro = cls(*args, belonging_membership=ro_data[1])
-                except TypeError:
-                    raise TypeError(
-                        f"Not enough param passed! You try to construct {cls} but those elements are passed {args}, {ro_data}")
-                ro.uid = uid
-                ReverbManager.add_new_reverb_object(ro)
-                ro_data = ro_data[2]
-            ro.sync(ro_data)
+            try:
+                ro = cls(*args, belonging_membership=ro_data[1])
+            except TypeError:
+                raise TypeError(
+                    f"Not enough param passed! You try to construct {cls} but those elements are passed {args}, {ro_data}")
+            ro.uid = ro_data[2]
+            ro.net_id = net_id
+            ro.sync(ro_data[3])
+            ro.is_initialized = True
+            new_ros.append(ro)
+
+        if new_ros:  # Spawned in one pass: one lock for the store, and the init hooks on the HOOK_POOL or the tick
+            ReverbManager.REVERB_OBJECTS.add_many(new_ros)
+            for ro in new_ros:
+                ReverbManager.queue_client_hook(ro.on_init_from_client)
+            manager_log.debug("%s new ReverbObjects add into 'CLIENT' side", len(new_ros))
 
     @staticmethod
     @server_event_registry.on_event("calling_server_computing")
-    def on_calling_server_computing(clt: socket.socket, uid: str, func_name: str, *args):
+    def on_calling_server_computing(clt: socket.socket, net_id: int, method_id: int, *args):
         """
         - Called on the 'Server' side
         - Called when a ReverbObject send data to be computed by the server (like movements, interactions, etc.)
         :param clt: The client socket
-        :param uid: The uid of the ReverbObject
-        :param func_name: The function name
+        :param net_id: The net_id of the ReverbObject
+        :param method_id: The id of the rpc into the rpc table of the ReverbObject
         :param args: Params of the function
         """
         try:
-            ro = ReverbManager.get_reverb_object(uid)
+            ro = ReverbManager.get_reverb_object_by_net_id(net_id)
             if ro == "DESTROYED":
                 return
         except ReverbObjectNotFoundError:
-            warn(f"You try to compute on the server with a uid not found {uid=}.\n"
-                 f"This may occur because the ro was removed and the syncing between the client and the server is not enough fast! or just because the uid is real2"
-                 f"ly not found!")
+            warn(f"You try to compute on the server with a net_id not found {net_id=}.\n"
+                 f"This may occur because the ro was removed and the syncing between the client and the server is not enough fast! or just because the net_id is "
+                 f"really not found!")
             return
 
+        connection = ReverbManager.REVERB_CONNECTION
+        if connection.rate_limits:
+            key = ReverbManager.get_rpc_key(ro, method_id)
+            if key and not connection.check_rate_limit(clt, key, partial(ReverbManager.run_server_rpc, ro, method_id,
+                                                                         args), include_connection=False):
+                return  # The frame was already counted by CONNECTION_LIMIT
+        ReverbManager.run_server_rpc(ro, method_id, args)
+
+    @staticmethod
+    def run_server_rpc(ro: ReverbObject, method_id: int, args: tuple | list):
+        """
+        - Call on 'SERVER' side
+        - Call an rpc received from a client, a rejected rpc is only warned
+        """
+        if not ro.is_alive:
+            return
         try:
-            func = getattr(ro, func_name)
-            if args == ():
-                func()
+            ReverbManager.call_rpc(ro, method_id, ReverbSide.SERVER, args)
+        except ReverbRpcNotRegisteredError as e:
+            warn(f"Rejected rpc call: {e}")
+        except ReverbRpcArgTypeError as e:
+            manager_log.warning("Rejected rpc call: %s", e)
+
+    @staticmethod
+    def get_rpc_key(ro: ReverbObject, method_id: int) -> str | None:
+        """
+        :return: The name of an rpc for the rate limits of the Server (ex: "Player.walk"), None if the id is invalid
+        """
+        rpcs = type(ro).REVERB_RPCS
+        if type(method_id) is not int or not 0 <= method_id < len(rpcs):
+            return None
+        return f"{ro.type}.{rpcs[method_id].name}"
+
+    @staticmethod
+    def flush_inputs():
+        """
+        - Call on the 'CLIENT' side once per tick (in your game loop)
+        - Send all the calls queued with queue_compute_server as a single packet
+        """
+        if ReverbManager.REVERB_SIDE == ReverbSide.CLIENT:
+            commands = ReverbManager.INPUT_CHANNEL.flush()
+            if commands:
+                ReverbManager.REVERB_CONNECTION.send("calling_server_computing_batch", commands)
+        else:
+            raise ReverbWrongSideError(ReverbManager.REVERB_SIDE)
+
+    @staticmethod
+    @server_event_registry.on_event("calling_server_computing_batch")
+    def on_calling_server_computing_batch(clt: socket.socket, commands: list[list], *args):
+        """
+        - Called on the 'Server' side
+        - Called when a client sends the calls of a frame, they are computed in order into this single thread
+        :param clt: The client socket
+        :param commands: List of [net_id, method_id, *args]
+        """
+        for command in commands:
+            if isinstance(command, list) and len(command) >= 2:
+                ReverbManager.on_calling_server_computing(clt, *command)
             else:
-                func(*args)
-        except AttributeError:
-            raise NameError(f"The {func_name=} wasn't found into the ReverbObject!")
+                warn(f"Rejected an invalid command into a batch: {command}")
+
+    @staticmethod
+    def send_request(net_id: int, method_id: int, args: tuple, timeout: float = None) -> Future:
+        """
+        - Call on the 'CLIENT' side
+        - Send a request to the server, the response is matched with its request_id
+        :param net_id: The net_id of the ReverbObject
+        :param method_id: The id of the rpc
+        :param args: The args of the rpc
+        :param timeout: Seconds before the future fails with a TimeoutError (None to wait forever)
+        :return: The Future of the response
+        """
+        if ReverbManager.REVERB_SIDE != ReverbSide.CLIENT:
+            raise ReverbWrongSideError(ReverbManager.REVERB_SIDE)
+
+        request_id = next(ReverbManager.REQUEST_IDS)
+        future = Future()
+        ReverbManager.PENDING_REQUESTS[request_id] = future
+        if timeout is not None:
+            REQUEST_TIMEOUTS.add(ReverbManager.PENDING_REQUESTS, request_id, timeout)
+        ReverbManager.REVERB_CONNECTION.send("calling_server_request", request_id, net_id, method_id, *args)
+        return future
+
+    @staticmethod
+    @server_event_registry.on_event("calling_server_request")
+    def on_calling_server_request(clt: socket.socket, request_id: int, net_id: int, method_id: int, *args):
+        """
+        - Called on the 'Server' side
+        - Compute the rpc and send back its return value (or its error) to the client
+        :param clt: The client socket
+        :param request_id: The id of the request given by the client
+        :param net_id: The net_id of the ReverbObject
+        :param method_id: The id of the rpc into the rpc table of the ReverbObject
+        :param args: Params of the function
+        """
+        try:
+            ro = ReverbManager.get_reverb_object_by_net_id(net_id)
+            if ro == "DESTROYED":
+                raise ReverbNetIdNotFoundError(net_id)
+            connection = ReverbManager.REVERB_CONNECTION
+            if connection.rate_limits:
+                key = ReverbManager.get_rpc_key(ro, method_id)
+                if key and not connection.check_rate_limit(clt, key, include_connection=False):  # Never coalesced
+                    raise ReverbRateLimitError(key)
+            result = ReverbManager.call_rpc(ro, method_id, ReverbSide.SERVER, args)
+            check_if_json_serializable(result)
+            response = (True, result)
+        except Exception as e:
+            response = (False, f"{e.__class__.__name__}: {e}")
+        ReverbManager.REVERB_CONNECTION.send_to(clt, "server_response", request_id, *response)
+
+    @staticmethod
+    @client_event_registry.on_event("server_response")
+    def on_server_response(clt: socket.socket, request_id: int, succeeded: bool, result, *args):
+        """
+        - Called on the 'Client' side
+        - Resolve the Future of a request
+        :param clt: The socket
+        :param request_id: The id of the request
+        :param succeeded: False if the rpc failed on the server
+        :param result: The return value or the error message
+        """
+        future = ReverbManager.PENDING_REQUESTS.pop(request_id, None)
+        if future is None:
+            return  # Already timed out
+        if not future.set_running_or_notify_cancel():
+            return  # Cancelled by the caller
+        if succeeded:
+            future.set_result(result)
+        else:
+            future.set_exception(ReverbRpcRemoteError(result))
+
+    @staticmethod
+    @client_event_registry.on_event("disconnection")
+    def on_disconnection_fail_requests(clt: socket.socket, *args):
+        """
+        - Called on the 'Client' side
+        - Fail all the requests still waiting for a response
+        """
+        for request_id in list(ReverbManager.PENDING_REQUESTS):
+            future = ReverbManager.PENDING_REQUESTS.pop(request_id, None)
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_exception(ConnectionError("Disconnected from the server before the response!"))
 
     @staticmethod
     @client_event_registry.on_event("calling_client_computing")
-    def on_calling_client_computing(clt: socket.socket, uid: str, func_name: str, *args):
+    def on_calling_client_computing(clt: socket.socket, net_id: int, method_id: int, *args):
         """
         - Called on the 'Client' side
         - Called when a ReverbObject send data to be computed by the client
         :param clt: The socket
-        :param uid: The uid of the ReverbObject
-        :param func_name: The function name
+        :param net_id: The net_id of the ReverbObject
+        :param method_id: The id of the rpc into the rpc table of the ReverbObject
         :param args: Params of the function
         """
         try:
-            ro = ReverbManager.get_reverb_object(uid)
+            ro = ReverbManager.get_reverb_object_by_net_id(net_id)
             if ro == "DESTROYED":
                 return
         except ReverbObjectNotFoundError:
-            warn(f"You try to compute on the client with a uid not found {uid=}.\n"
-                 f"This may occur because the ro was removed and the syncing between the client and the server is not enough fast! or just because the uid is rea"
-                 f"ly not found!")
+            warn(f"You try to compute on the client with a net_id not found {net_id=}.\n"
+                 f"This may occur because the ro was removed and the syncing between the client and the server is not enough fast! or just because the net_id is "
+                 f"really not found!")
             return
 
         try:
-            func = getattr(ro, func_name)
-            if args == ():
-                func()
-            else:
-                func(*args)
-        except AttributeError:
-            raise NameError(f"The {func_name=} wasn't found into the ReverbObject!")
+            ReverbManager.call_rpc(ro, method_id, ReverbSide.CLIENT, args)
+        except ReverbRpcNotRegisteredError as e:
+            warn(f"Rejected rpc call: {e}")
+        except ReverbRpcArgTypeError as e:
+            manager_log.warning("Rejected rpc call: %s", e)
+
+    @staticmethod
+    def call_rpc(ro: ReverbObject, method_id: int, side: ReverbSide, args: tuple | list):
+        """
+        - Call a registered rpc of a ReverbObject from its method_id
+        - Unregistered method_id or rpc from the other side are rejected
+        :param ro: The ReverbObject
+        :param method_id: The id of the rpc into the rpc table of the ReverbObject
+        :param side: The side that is executing the rpc
+        :param args: The encoded args received
+        :return: The return value of the rpc, ReverbRpcNotRegisteredError or ReverbRpcArgTypeError if it is rejected
+        """
+        rpcs = type(ro).REVERB_RPCS
+        if type(method_id) is not int or not 0 <= method_id < len(rpcs) or rpcs[method_id].side != side:
+            raise ReverbRpcNotRegisteredError(ro, f"{method_id=}")
+        rpc = rpcs[method_id]
+        if profiler.enabled:
+            event_name = "calling_server_computing" if side == ReverbSide.SERVER else "calling_client_computing"
+            return profiler.call(event_name, f"{ro.type}.{rpc.name}", rpc.func, ro, *rpc.decode_args(args))
+        return rpc.func(ro, *rpc.decode_args(args))
 
     @staticmethod
     def reverb_object_attribute(cls):
@@ -626,6 +2084,8 @@ class ReverbManager:
         """
         if issubclass(cls, ReverbObject):
             ReverbManager.add_type_if_dont_exit(cls)
+            ReverbRpc.build_table(cls)
+            cls.REVERB_CODECS = {}  # Its own codecs, built from its instances
         else:
             raise TypeError(f"The class {cls} must be derivative from a ReverbObject!")
         return cls
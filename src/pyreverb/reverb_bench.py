@@ -0,0 +1,226 @@
+import argparse
+import multiprocessing
+import statistics
+
+from . import reverb
+from .reverb import *
+
+
+@ReverbManager.reverb_object_attribute
+class BenchBot(ReverbObject):
+    """
+    The ReverbObject of a bot
+    """
+
+    def __init__(self, pos=[0, 0], belonging_membership: int = None):
+        self.pos = SyncVar(pos)
+        super().__init__(self.pos, belonging_membership=belonging_membership)
+
+    @server_rpc
+    def walk(self, dx: int, dy: int):
+        x, y = self.pos.get([0, 0])
+        self.pos.set([x + dx, y + dy])
+
+    @server_rpc
+    def echo(self, value):
+        return value
+
+
+def get_memory_kb() -> int | None:
+    """
+    :return: The resident memory of this process in kB (None if unknown on this OS)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Peak, not current
+        except ImportError:
+            return None
+
+
+def summarize(values: list[float], scale: float = 1) -> dict[str, float]:
+    """
+    :param values: The samples
+    :param scale: Multiply the samples (ex: 1000 for seconds to ms)
+    :return: mean, p50, p95, p99 and max of the samples
+    """
+    if not values:
+        return {}
+    values = sorted(v * scale for v in values)
+    summary = {"mean": statistics.fmean(values)}
+    for p in (50, 95, 99):
+        summary[f"p{p}"] = values[min(len(values) - 1, len(values) * p // 100)]
+    summary["max"] = values[-1]
+    return summary
+
+
+def run_bot(port: int, duration: float, tick_rate: int, rpc_every: int, results: multiprocessing.Queue):
+    """
+    Entry point of a bot process: walk every tick and measure the latency of an echo request every rpc_every ticks
+    """
+    reverb.set_verbose(0)
+    ReverbManager.REVERB_SIDE = ReverbSide.CLIENT
+    client = Client(port=port)
+    ReverbManager.REVERB_CONNECTION = client
+    if not client.connect():
+        results.put(None)
+        return
+
+    bot = None
+    deadline = time.perf_counter() + 10
+    while bot is None and time.perf_counter() < deadline:
+        bot = next((b for b in ReverbManager.get_all_ro_by_type(BenchBot) if b.is_owner()), None)
+        time.sleep(0.01)
+    if bot is None:
+        results.put(None)
+        client.disconnect()
+        return
+
+    latencies = []
+
+    def on_echo(future):
+        if future.exception() is None:
+            latencies.append(time.perf_counter() - future.result())
+
+    period = 1 / tick_rate
+    start = next_tick = time.perf_counter()
+    tick = 0
+    while time.perf_counter() - start < duration:
+        bot.queue_compute_server(bot.walk, 1, 0, coalesce=True)
+        if tick % rpc_every == 0:
+            bot.request_server(bot.echo, time.perf_counter(), timeout=5).add_done_callback(on_echo)
+        ReverbManager.tick(period)
+        tick += 1
+        next_tick += period
+        time.sleep(max(0.0, next_tick - time.perf_counter()))
+    time.sleep(0.5)  # Last responses
+
+    results.put({"latencies": latencies, "frames_in": client.frames_in, "bytes_in": client.bytes_in,
+                 "frames_out": client.frames_out, "bytes_out": client.bytes_out, "memory_kb": get_memory_kb()})
+    client.disconnect()
+
+
+def run_benchmark(bots=10, duration=10.0, tick_rate=60, port=8090, rpc_every=10) -> dict:
+    """
+    - Start a Server on loopback and bots into other processes, then measure the server while they play
+    - Call it only into a process that is not already a 'SERVER' or a 'CLIENT'
+    :param bots: The number of bots
+    :param duration: Seconds of measure
+    :param tick_rate: Ticks per second of the server and of the bots
+    :param port: The port of the server
+    :param rpc_every: A bot sends an echo request every rpc_every ticks
+    :return: The report
+    """
+    reverb.set_verbose(0)
+    ReverbManager.REVERB_SIDE = ReverbSide.SERVER
+    server = Server(port=port)
+    ReverbManager.REVERB_CONNECTION = server
+
+    @server_event_registry.on_event("client_connection")
+    def on_bot_connection(clt: socket.socket, *args):
+        ReverbManager.add_new_reverb_object(BenchBot(belonging_membership=clt.getpeername()[1]))
+
+    @server_event_registry.on_event("client_disconnection")
+    def on_bot_disconnection(clt: socket.socket, *args):
+        for ro in ReverbManager.get_reverb_objects_by_belonging_membership(clt.getpeername()[1]):
+            ReverbManager.remove_reverb_object(ro.uid)
+
+    sync_start = [0.0]
+
+    @ReverbManager.on_tick(TickPhase.SYNC)
+    def on_sync_phase(dt):
+        sync_start[0] = time.perf_counter()  # server_sync is called just after the SYNC hooks
+
+    server.start_server()
+    memory_before = get_memory_kb()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [context.Process(target=run_bot, args=(port, duration, tick_rate, rpc_every, results), daemon=True)
+                 for _ in range(bots)]
+    for process in processes:
+        process.start()
+
+    period = 1 / tick_rate
+    last = time.perf_counter()
+
+    def tick() -> float:
+        """:return: The duration of server_sync"""
+        nonlocal last
+        now = time.perf_counter()
+        ReverbManager.tick(now - last)
+        sync_duration = time.perf_counter() - sync_start[0]
+        last = now
+        time.sleep(max(0.0, period - (time.perf_counter() - now)))
+        return sync_duration
+
+    deadline = time.perf_counter() + 30
+    while len(server.clients) < bots and time.perf_counter() < deadline:
+        tick()
+    connected = len(server.clients)
+    memory_connected = get_memory_kb()
+
+    sync_durations, bytes_per_tick = [], []
+    frames_in, frames_out = server.frames_in, server.frames_out
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        bytes_out = server.bytes_out
+        sync_durations.append(tick())
+        bytes_per_tick.append(server.bytes_out - bytes_out)
+    elapsed = time.perf_counter() - start
+    ros = ReverbManager.REVERB_OBJECTS.alive_count()
+    frames_in, frames_out = server.frames_in - frames_in, server.frames_out - frames_out
+
+    bot_results = []
+    for _ in processes:
+        try:
+            result = results.get(timeout=duration + 10)
+        except Exception:
+            break
+        if result:
+            bot_results.append(result)
+    for process in processes:
+        process.join(timeout=5)
+
+    server.stop_server()
+    ReverbManager.REVERB_SIDE = None  # No log saving at exit
+
+    latencies = [latency for result in bot_results for latency in result["latencies"]]
+    return {
+        "bots": bots,
+        "connected_bots": connected,
+        "reporting_bots": len(bot_results),
+        "duration_s": elapsed,
+        "tick_rate": tick_rate,
+        "ros": ros,
+        "server_messages_in_per_s": frames_in / elapsed,
+        "server_messages_out_per_s": frames_out / elapsed,
+        "server_bytes_out_per_tick": summarize(bytes_per_tick),
+        "server_sync_ms": summarize(sync_durations, 1000),
+        "rpc_latency_ms": summarize(latencies, 1000),
+        "server_memory_per_client_kb": (memory_connected - memory_before) / connected
+        if connected and memory_before is not None else None,
+        "bot_memory_kb": summarize([r["memory_kb"] for r in bot_results if r["memory_kb"] is not None]),
+        "bot_bytes_in_per_s": summarize([r["bytes_in"] / duration for r in bot_results]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless benchmark of PyReverb: a server and bots on loopback")
+    parser.add_argument("--bots", type=int, default=10, help="Number of bot clients")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of measure")
+    parser.add_argument("--tick-rate", type=int, default=60, help="Ticks per second")
+    parser.add_argument("--port", type=int, default=8090, help="Port of the server")
+    parser.add_argument("--rpc-every", type=int, default=10, help="A bot sends an echo request every N ticks")
+    parser.add_argument("--json", help="Write the report into this file")
+    cli_args = parser.parse_args()
+
+    report = run_benchmark(cli_args.bots, cli_args.duration, cli_args.tick_rate, cli_args.port, cli_args.rpc_every)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if cli_args.json:
+        with open(cli_args.json, "w") as f:
+            f.write(text)
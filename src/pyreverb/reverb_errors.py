@@ -24,6 +24,33 @@ class ReverbObjectNotFoundError(Exception):
         super().__init__(f"ReverbObject not found with {uid=}")
 
 
+class ReverbNetIdNotFoundError(ReverbObjectNotFoundError):
+    def __init__(self, net_id):
+        Exception.__init__(self, f"ReverbObject not found with {net_id=}")
+
+
 class ReverbTypeNotFoundError(Exception):
     def __init__(self, t):
         super().__init__(f"The type={t} is not found into the registry!")
+
+
+class ReverbRpcNotRegisteredError(Exception):
+    def __init__(self, ro, func_name):
+        super().__init__(
+            f"The method '{func_name}' of '{ro.__class__.__name__}' is not registered as an rpc! Decorate it with @server_rpc or @client_rpc.")
+
+
+class ReverbRpcRemoteError(Exception):
+    def __init__(self, msg):
+        super().__init__(f"The rpc failed on the other side: {msg}")
+
+
+class ReverbRateLimitError(Exception):
+    def __init__(self, key):
+        super().__init__(f"Rate limit exceeded for '{key}'! The call is dropped by the server.")
+
+
+class ReverbRpcArgTypeError(Exception):
+    def __init__(self, rpc_name, index, expected, arg):
+        super().__init__(
+            f"The arg {index} of the rpc '{rpc_name}' has to be {expected.__name__}, got {type(arg).__name__}: {arg!r:.50}")
@@ -1,18 +1,37 @@
+import bisect
+import contextvars
 import datetime
+import itertools
 import json
+import math
 import os
+import pickle
 import re
+import select
 import socket
 import struct
 import sys
+import tempfile
 import threading
 import time
+import weakref
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from functools import partial, update_wrapper
 from io import StringIO
 from json import JSONDecodeError
+from multiprocessing import shared_memory
 from warnings import warn
 
 from colorama import Fore, Back, Style
 
+try:
+    import fcntl
+    import termios
+except ImportError:  # Windows
+    pass
+
 
 class Tee:
     """Store the console"""
@@ -69,13 +88,422 @@ def save_logs(path: str = "./logs/"):
     print("Log saved!")
 
 
+LOG_DEBUG = 10  # Messages of each object (spawns, destructions...)
+LOG_INFO = 20  # Connections and life of the server/client
+LOG_WARNING = 30  # Anomalies
+LOG_OFF = 100
+LOG_LEVEL = LOG_DEBUG  # The messages under this level are neither formatted nor printed (see set_log_level)
+
+
+def set_log_level(level: int):
+    """
+    :param level: LOG_DEBUG, LOG_INFO, LOG_WARNING or LOG_OFF
+    """
+    global LOG_LEVEL
+    LOG_LEVEL = level
+
+
+class Logger:
+    """
+    - Leveled messages with the style of a part of PyReverb (SERVER, CLIENT...)
+    - Give the args instead of an f-string: the message is only formatted if its level is enabled
+    - sampled() prints only one message every SAMPLE_EVERY of the same kind (ex: the spawns of many bullets)
+    """
+    SAMPLE_EVERY = 100
+
+    def __init__(self, name: str, back: str):
+        """
+        :param name: The name into the prefix
+        :param back: The colorama background of the prefix
+        """
+        self.prefix = f"{back + Fore.RED}[{Fore.RESET}{name}{Fore.RED}]{Style.RESET_ALL} "
+        self.counts: dict[str, itertools.count] = {}  # Kind of sampled message -> counter of its messages
+
+    @staticmethod
+    def is_enabled(level: int) -> bool:
+        return level >= LOG_LEVEL
+
+    def log(self, level: int, msg: str, *args):
+        """
+        :param level: The level of the message
+        :param msg: The message, formatted with % if args are given
+        :param args: The args of the message
+        """
+        if level >= LOG_LEVEL:
+            sys.stdout.write(f"{self.prefix}{msg % args if args else msg}\n")  # One write for the Tee
+
+    def debug(self, msg: str, *args):
+        if LOG_DEBUG >= LOG_LEVEL:
+            self.log(LOG_DEBUG, msg, *args)
+
+    def info(self, msg: str, *args):
+        if LOG_INFO >= LOG_LEVEL:
+            self.log(LOG_INFO, msg, *args)
+
+    def warning(self, msg: str, *args):
+        if LOG_WARNING >= LOG_LEVEL:
+            self.log(LOG_WARNING, msg, *args)
+
+    def sampled(self, kind: str, msg: str, *args, level: int = LOG_DEBUG):
+        """
+        Count the messages of a kind and print the first one then one every SAMPLE_EVERY, with the count
+        :param kind: The kind of message (ex: "spawn")
+        :param msg: The message, formatted with % if args are given
+        :param args: The args of the message
+        :param level: The level of the message
+        """
+        if level < LOG_LEVEL:
+            return
+        counter = self.counts.get(kind)
+        if counter is None:
+            counter = self.counts.setdefault(kind, itertools.count(1))  # setdefault: one counter if threads race
+        count = next(counter)  # Atomic, unlike += on the dict
+        if count == 1 or count % self.SAMPLE_EVERY == 0:
+            self.log(level, f"{msg % args if args else msg} (x{count})")
+
+
+server_log = Logger("SERVER", Back.GREEN)
+client_log = Logger("CLIENT", Back.BLUE)
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets: observing a value is just a bisect and some additions
+    """
+    BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)  # Seconds
+
+    def __init__(self, bounds: tuple[float, ...] = BOUNDS):
+        """
+        :param bounds: The upper bounds of the buckets (sorted)
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last bucket is +inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        """
+        Add a value
+        :param value: The value
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        """
+        :param p: The percentile (0-100)
+        :return: The upper bound of the bucket of the percentile (max for the +inf bucket)
+        """
+        rank = self.count * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return 0.0
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "sum": self.total, "max": self.max,
+                "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.percentile(50), "p95": self.percentile(95), "p99": self.percentile(99),
+                "buckets": dict(zip([str(b) for b in self.bounds] + ["+inf"], self.counts))}
+
+
+class Metrics:
+    """
+    Registry of the counters, gauges and histograms of the process.
+    - Frames and bytes are counted by event name and by connection
+    - Collectors are called on snapshot() to refresh the gauges that are only needed when read
+    The counters are updated without lock: under heavy concurrency a few increments can be lost.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.counters: dict[str, int] = defaultdict(int)
+        self.gauges: dict[str, float] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self.frames: dict[tuple[str, str], list[int]] = {}  # (direction, event_name) -> [frames, bytes]
+        self.connections: dict[tuple | str, dict[str, float]] = {}  # peer address -> stats (joined by snapshot)
+        self.collectors = []
+        self._dump_thread: threading.Thread = None
+
+    def count(self, name: str, value: int = 1):
+        if self.enabled:
+            self.counters[name] += value
+
+    def gauge(self, name: str, value: float):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """
+        Add a value to a histogram (created on the first call)
+        """
+        if self.enabled:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def count_frame(self, direction: str, event_name: str, size: int, peer=None):
+        """
+        Count a frame sent or received
+        :param direction: "in" or "out"
+        :param event_name: The name of the packet/event
+        :param size: The size of the frame in bytes
+        :param peer: The address of the connection (only counted if registered with add_connection)
+        """
+        if not self.enabled:
+            return
+        stats = self.frames.get((direction, event_name))
+        if stats is None:
+            stats = self.frames[(direction, event_name)] = [0, 0]
+        stats[0] += 1
+        stats[1] += size
+        if peer is not None:
+            connection = self.connections.get(peer)
+            if connection is not None:  # Never created here: a late send can't bring back a forgotten connection
+                connection[f"frames_{direction}"] += 1
+                connection[f"bytes_{direction}"] += size
+
+    def add_connection(self, peer):
+        """
+        Start the stats of a new connection (until forget_connection)
+        :param peer: The address of the connection
+        """
+        if self.enabled:
+            self.connections[peer] = {"frames_in": 0, "bytes_in": 0, "frames_out": 0, "bytes_out": 0}
+
+    def get_connection(self, peer) -> dict[str, float] | None:
+        """
+        :param peer: The address of the connection
+        :return: The stats of the connection (None if not registered)
+        """
+        return self.connections.get(peer)
+
+    def forget_connection(self, peer):
+        """
+        Remove the stats of a closed connection
+        """
+        self.connections.pop(peer, None)
+
+    def add_collector(self, func):
+        """
+        :param func: A function called with this Metrics on each snapshot() to refresh some gauges (added once)
+        """
+        if func not in self.collectors:
+            self.collectors.append(func)
+
+    def remove_collector(self, func):
+        if func in self.collectors:
+            self.collectors.remove(func)
+
+    def snapshot(self) -> dict:
+        """
+        :return: A JSON serializable copy of all the metrics
+        """
+        for collector in list(self.collectors):
+            try:
+                collector(self)
+            except Exception as e:
+                warn(f"A metrics collector failed: {e}")
+        frames = {}
+        for (direction, event_name), (count, size) in list(self.frames.items()):
+            frames.setdefault(event_name, {})[direction] = {"frames": count, "bytes": size}
+        return {"time": time.time(),
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {name: h.to_dict() for name, h in list(self.histograms.items())},
+                "frames": frames,
+                "connections": {peer if isinstance(peer, str) else ":".join(str(p) for p in peer): dict(stats)
+                                for peer, stats in list(self.connections.items())}}
+
+    def reset(self):
+        """
+        Clear all the metrics (the collectors are kept)
+        """
+        self.counters.clear()
+        self.gauges.clear()
+        self.histograms.clear()
+        self.frames.clear()
+        self.connections.clear()
+
+    def dump(self, path: str):
+        """
+        Append a snapshot as a JSON line into a file
+        :param path: The path of the file
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    def start_periodic_dump(self, path: str, interval: float = 60):
+        """
+        Start a thread that dumps a snapshot every interval seconds
+        :param path: The path of the file (JSON lines)
+        :param interval: Seconds between two dumps
+        """
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+
+        if self._dump_thread is None:
+            self._dump_thread = threading.Thread(target=loop, daemon=True)
+            self._dump_thread.start()
+
+
+metrics = Metrics()
+
+
+def get_outbound_queue_size(sock: socket.socket) -> int | None:
+    """
+    :return: The bytes not sent yet into the kernel buffer of the socket (None if unknown on this OS)
+    """
+    try:
+        return struct.unpack("i", fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, b"\0\0\0\0"))[0]
+    except (NameError, OSError, AttributeError):
+        return None
+
+
+class HandlerProfiler:
+    """
+    Opt-in instrumentation of the handlers (events and rpcs): wall and CPU time per invocation.
+    - Disabled by default: when disabled the handlers are called directly
+    - A handler slower than slow_threshold is reported with warn()
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_threshold: float = None  # Seconds (None: no report)
+        self.stats: dict[tuple[str, str], list[float]] = {}  # (event_name, label) -> [calls, wall, cpu, max wall]
+
+    def call(self, event_name: str, label: str, func, *args):
+        """
+        Call a handler and measure it
+        :param event_name: The name of the event
+        :param label: What is called (ex: "Player.walk")
+        :param func: The handler
+        :param args: The args of the handler
+        :return: The return value of the handler
+        """
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return func(*args)
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            stats = self.stats.get((event_name, label))
+            if stats is None:
+                stats = self.stats[(event_name, label)] = [0, 0.0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += wall
+            stats[2] += cpu
+            if wall > stats[3]:
+                stats[3] = wall
+            if self.slow_threshold is not None and wall > self.slow_threshold:
+                metrics.count("slow_handlers")
+                warn(f"Slow handler on '{event_name}': {label} took {wall * 1000:.2f}ms (cpu: {cpu * 1000:.2f}ms)")
+
+    def snapshot(self) -> list[dict]:
+        """
+        :return: The stats of the handlers, the most expensive first
+        """
+        rows = [{"event": event_name, "handler": label, "calls": calls, "wall_s": wall, "cpu_s": cpu,
+                 "mean_wall_ms": wall / calls * 1000, "max_wall_ms": max_wall * 1000}
+                for (event_name, label), (calls, wall, cpu, max_wall) in list(self.stats.items())]
+        return sorted(rows, key=lambda row: row["wall_s"], reverse=True)
+
+    def reset(self):
+        self.stats.clear()
+
+
+profiler = HandlerProfiler()
+
+
+class SamplingProfiler:
+    """
+    Sample the stacks of all the threads of the process from a background thread (sys._current_frames).
+    The result is in the collapsed format of the flame graph tools: "func_a;func_b;func_c count".
+    """
+
+    def __init__(self, interval: float = 0.001):
+        """
+        :param interval: Seconds between two samples
+        """
+        self.interval = interval
+        self.samples: dict[str, int] = defaultdict(int)
+        self._running = False
+        self._thread: threading.Thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> dict[str, int]:
+        """
+        :return: The number of samples by collapsed stack
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+        return dict(self.samples)
+
+    def _sample(self):
+        """Thread of the sampling"""
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while self._running:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    def dump(self, path: str):
+        """
+        Write the samples in the collapsed format
+        :param path: The path of the file
+        """
+        with open(path, "w") as f:
+            for stack, count in sorted(self.samples.items(), key=lambda item: item[1], reverse=True):
+                f.write(f"{stack} {count}\n")
+
+
+def spawn_thread(target, *args) -> threading.Thread:
+    """
+    Start a daemon thread that keeps the context of the caller (ex: the current ReverbWorld)
+    :param target: The function of the thread
+    :param args: Its args
+    :return: The thread
+    """
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(target, *args), daemon=True)
+    thread.start()
+    return thread
+
+
 class EventRegistry:
     """
     A Class that store events and handle them!
     """
 
-    def __init__(self):
+    def __init__(self, parent: "EventRegistry" = None):
+        """
+        :param parent: A registry whose handlers are also triggered (before the ones of this registry)
+        """
         self._events = {}
+        self.parent = parent
 
     def add_event(self, func, event_name):
         """
@@ -129,21 +557,36 @@ class EventRegistry:
         :param threading_event: If true, it will handle the event into a new thread else it will just execute the event into the main thread
         """
         handlers = self._events.get(event_name, [])  # Check if the event name contains functions or not
+        if self.parent is not None:
+            handlers = self.parent._events.get(event_name, []) + handlers
         if handlers:
             for handler in handlers:
                 try:
                     if threading_event:
-                        threading.Thread(target=handler, args=(sock, *args), daemon=True).start()
+                        spawn_thread(EventRegistry._run_handler, event_name, handler, time.perf_counter(), sock, *args)
+                    elif profiler.enabled:
+                        profiler.call(event_name, handler.__qualname__, handler, sock, *args)
                     else:
                         handler(sock, *args)
                 except TypeError:
                     if threading_event:
-                        threading.Thread(target=handler, args=sock, daemon=True).start()
+                        spawn_thread(handler, sock)
                     else:
                         handler(sock)
         else:
             warn(f"The handler for '{event_name}' is not found ! It may be normal, ignore then.")
 
+    @staticmethod
+    def _run_handler(event_name, handler, triggered_at: float, sock, *args):
+        """
+        Thread of a handler: measure the delay before it starts
+        """
+        metrics.observe("handler_dispatch_latency", time.perf_counter() - triggered_at)
+        if profiler.enabled:
+            profiler.call(event_name, handler.__qualname__, handler, sock, *args)
+        else:
+            handler(sock, *args)
+
     def all_events(self):
         """
         :return: All events
@@ -170,18 +613,26 @@ class Packet:
         """
         return json.dumps({"name": name, "contents": content}).encode()
 
+    @staticmethod
+    def create_frame(name: str, *content):
+        """
+        Create a packet with its length header
+        :param name: Name of the packet/event
+        :param content: The contents to send
+        :return: The bytes to send on the socket
+        """
+        packet = Packet.create_packet(name, *content)
+        return struct.pack('!I', len(packet)) + packet
+
     @staticmethod
     def recv_exact(sock: socket.socket, n: int):
         data = b""
-        try:
-            while len(data) < n:
-                chunk = sock.recv(n - len(data))
-                if not chunk:
-                    raise ConnectionError("The socket is close...")
-                data += chunk
-            return data
-        except ConnectionAbortedError:
-            return b""
+        while len(data) < n:
+            chunk = sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("The socket is close...")
+            data += chunk
+        return data
 
     @staticmethod
     def decode_packet(packet: bytes):
@@ -199,20 +650,623 @@ class Packet:
             warn(f"The packet is not valid ! A valid packet must have a 'name' and a 'contents' argument !")
 
 
+def _encode_frames_from_shared_table(shm_name: str, size: int, packet_name: str, groups: list[list]) -> list[bytes]:
+    """
+    Worker of the FrameEncoderPool
+    :return: A frame per group, with the entries of the table listed into the group
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        table = pickle.loads(shm.buf[:size])
+    finally:
+        shm.close()
+    return [Packet.create_frame(packet_name, {key: table[key] for key in group}) for group in groups]
+
+
+class FrameEncoderPool:
+    """
+    Encode a different packet for each client into worker processes (not limited by the GIL).
+    The table is shared once per call with the workers through shared memory, each worker encodes a part of the clients.
+    """
+
+    def __init__(self, workers: int = None):
+        """
+        :param workers: Number of worker processes (by default the number of CPUs)
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.workers)
+
+    def encode(self, packet_name: str, table: dict, groups: list[list]) -> list[bytes]:
+        """
+        :param packet_name: The name of the packet/event
+        :param table: All the entries that can be sent
+        :param groups: For each client, the keys of the table to send
+        :return: For each client, the frame of the packet {key: table[key] for key in its group}
+        """
+        data = pickle.dumps(table, pickle.HIGHEST_PROTOCOL)
+        shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        try:
+            shm.buf[:len(data)] = data
+            chunk = math.ceil(len(groups) / self.workers) or 1
+            futures = [self.executor.submit(_encode_frames_from_shared_table, shm.name, len(data), packet_name,
+                                            groups[i:i + chunk]) for i in range(0, len(groups), chunk)]
+            frames = []
+            for future in futures:
+                frames.extend(future.result())
+            return frames
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        """
+        Stop the worker processes
+        """
+        self.executor.shutdown()
+
+
+class PeerSocket(socket.socket):
+    """
+    A socket of a connected client that remembers its peer address (getpeername fails once the peer is gone)
+    """
+
+    def __init__(self, sock: socket.socket, peername=None):
+        """
+        :param sock: The connected socket (it is detached, use this one instead)
+        :param peername: The address to give (by default the peer address of the socket)
+        """
+        peername = peername or sock.getpeername()
+        super().__init__(sock.family, sock.type, sock.proto, fileno=sock.detach())
+        self._peername = peername
+
+    def getpeername(self):
+        return self._peername
+
+
+LOCAL_ID_START = 65536  # The ids of the local connections are greater than all the TCP ports
+
+
+def can_send_now(sock, size: int) -> bool:
+    """
+    :param sock: The socket (or a ShmRingSocket)
+    :param size: The bytes to send
+    :return: True if the bytes can be sent without waiting for the other side to read
+    """
+    try:
+        if isinstance(sock, ShmRingSocket):
+            return not sock.send_lock.locked() and sock.tx.capacity - sock.tx.available() >= size
+        _, writable, _ = select.select([], [sock], [], 0)
+        return bool(writable)
+    except (OSError, ValueError, TypeError):  # Closed
+        return False
+
+
+def close_connection(sock):
+    """
+    Shut down a connection from another thread: the thread blocked on recv wakes up and sees a closed connection
+    :param sock: The socket (or a ShmRingSocket)
+    """
+    try:
+        if isinstance(sock, ShmRingSocket):
+            sock.close()
+        else:
+            sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def local_socket_path(port: int) -> str:
+    """
+    :param port: The port of the server
+    :return: The default path of the Unix socket of the server (see Server.start_local_server)
+    """
+    return os.path.join(tempfile.gettempdir(), f"pyreverb-{port}.sock")
+
+
+class ShmRing:
+    """
+    Single producer, single consumer ring buffer of bytes into shared memory.
+    Header: head (written by the producer), tail (written by the consumer), capacity, sleeping and closed flags.
+    """
+    HEAD, TAIL, CAPACITY, SLEEPING, CLOSED, DATA = 0, 8, 16, 24, 25, 64
+
+    def __init__(self, name: str = None, capacity: int = 1 << 20, track: bool = True):
+        """
+        :param name: The name of an existing ring (None to create one)
+        :param capacity: The size of the data of a new ring
+        :param track: When attaching, False lets the creator alone unlink the memory
+        """
+        self.is_owner = name is None
+        if self.is_owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self.DATA + capacity)
+            self.shm.buf[:self.DATA] = bytes(self.DATA)
+            struct.pack_into("Q", self.shm.buf, self.CAPACITY, capacity)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            if not track:
+                try:
+                    from multiprocessing import resource_tracker
+                    resource_tracker.unregister(self.shm._name, "shared_memory")
+                except Exception:
+                    pass
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.capacity = struct.unpack_from("Q", self.buf, self.CAPACITY)[0]
+
+    def _get(self, offset: int) -> int:
+        return struct.unpack_from("Q", self.buf, offset)[0]
+
+    def available(self) -> int:
+        """:return: The bytes waiting to be read"""
+        return self._get(self.HEAD) - self._get(self.TAIL)
+
+    def write(self, data: memoryview) -> int:
+        """
+        Producer side: write as much as possible
+        :param data: The bytes
+        :return: The number of bytes written (0 if the ring is full)
+        """
+        head = self._get(self.HEAD)
+        n = min(self.capacity - (head - self._get(self.TAIL)), len(data))
+        if n <= 0:
+            return 0
+        start = head % self.capacity
+        first = min(n, self.capacity - start)
+        self.buf[self.DATA + start:self.DATA + start + first] = data[:first]
+        if n > first:
+            self.buf[self.DATA:self.DATA + n - first] = data[first:n]
+        struct.pack_into("Q", self.buf, self.HEAD, head + n)  # Published after the data
+        return n
+
+    def read(self, n: int) -> bytes:
+        """
+        Consumer side: read at most n bytes
+        :return: The bytes (empty if the ring is empty)
+        """
+        tail = self._get(self.TAIL)
+        n = min(self._get(self.HEAD) - tail, n)
+        if n <= 0:
+            return b""
+        start = tail % self.capacity
+        first = min(n, self.capacity - start)
+        data = bytes(self.buf[self.DATA + start:self.DATA + start + first])
+        if n > first:
+            data += bytes(self.buf[self.DATA:self.DATA + n - first])
+        struct.pack_into("Q", self.buf, self.TAIL, tail + n)
+        return data
+
+    @property
+    def sleeping(self) -> bool:
+        return bool(self.buf[self.SLEEPING])
+
+    @sleeping.setter
+    def sleeping(self, value: bool):
+        self.buf[self.SLEEPING] = int(value)
+
+    @property
+    def closed(self) -> bool:
+        return bool(self.buf[self.CLOSED])
+
+    def close(self):
+        """
+        Mark the ring as closed for the other side and release it (the creator unlinks it)
+        """
+        try:
+            self.buf[self.CLOSED] = 1
+        except (ValueError, TypeError):
+            return  # Already released
+        self.buf = None
+        self.shm.close()
+        if self.is_owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class ShmRingSocket:
+    """
+    A connection to a process of the same machine: the frames go through two ShmRing, the Unix socket is only used
+    to wake up the reader and to know when the other side is gone.
+    It has the methods of a socket used by Client and Server, so the framing and the events are the same.
+    """
+    WAIT_TIMEOUT = 0.01  # Seconds between two checks of the ring when no wake up is received
+
+    def __init__(self, sock: socket.socket, rx: ShmRing, tx: ShmRing, peername):
+        """
+        :param sock: The connected Unix socket
+        :param rx: The ring written by the other side
+        :param tx: The ring read by the other side
+        :param peername: The address of the other side
+        """
+        self.sock = sock
+        self.rx = rx
+        self.tx = tx
+        self._peername = peername
+        self.family = sock.family
+        self.send_lock = threading.Lock()
+        self.recv_lock = threading.Lock()
+        self.is_closed = False
+
+    def getpeername(self):
+        return self._peername
+
+    def getsockname(self):
+        return self.sock.getsockname()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def sendall(self, data: bytes):
+        view = memoryview(data)
+        with self.send_lock:
+            while view:
+                if self.is_closed or self.tx.closed:
+                    raise ConnectionResetError("The shared memory connection is close...")
+                n = self.tx.write(view)
+                if n:
+                    view = view[n:]
+                    if self.tx.sleeping:
+                        try:
+                            self.sock.send(b"\0", socket.MSG_DONTWAIT)  # Wake up the reader
+                        except BlockingIOError:
+                            pass  # Already many wake ups waiting
+                        except OSError:
+                            raise ConnectionResetError("The shared memory connection is close...")
+                else:
+                    time.sleep(0.0001)  # The ring is full
+
+    def recv(self, n: int) -> bytes:
+        """
+        :return: Up to n bytes, b"" when the other side is gone
+        """
+        with self.recv_lock:
+            while not self.is_closed:
+                data = self.rx.read(n)
+                if data or self.rx.closed:
+                    return data
+                self.rx.sleeping = True
+                try:
+                    if not self.rx.available():
+                        ready, _, _ = select.select([self.sock], [], [], self.WAIT_TIMEOUT)
+                        if ready and not self.sock.recv(4096):
+                            return self.rx.read(n)  # The last bytes if any
+                except (OSError, ValueError):  # Closed by another thread
+                    return b""
+                finally:
+                    self.rx.sleeping = False
+            return b""
+
+    def close(self):
+        if not self.is_closed:
+            self.is_closed = True
+            with self.send_lock:
+                self.tx.close()
+            self.sock.close()  # Wakes up the reader
+            with self.recv_lock:
+                self.rx.close()
+
+
+CAPTURE_MAGIC = b"RVBCAP\x00\x01"
+CAPTURE_RECORD = struct.Struct("!dBII")  # timestamp, direction, connection id, length of the packet
+CAPTURE_IN, CAPTURE_OUT, CAPTURE_EVENT = 0, 1, 2  # CAPTURE_EVENT: a local event (ex: 'client_connection') as packet
+
+
+class PacketCapture:
+    """
+    Append-only binary log of the packets of a connection: a header then records (see CAPTURE_RECORD) followed by
+    the packet. Read it with pyreverb.reverb_replay.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: The path of the capture file (created or appended)
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.file = open(path, "ab", buffering=1 << 16)
+        if self.file.tell() == 0:
+            self.file.write(CAPTURE_MAGIC)
+        self.lock = threading.Lock()
+
+    def write(self, direction: int, conn_id: int, packet: bytes | memoryview):
+        """
+        Append a record
+        :param direction: CAPTURE_IN, CAPTURE_OUT or CAPTURE_EVENT
+        :param conn_id: The id of the connection (the port of the client, as the belonging_membership)
+        :param packet: The packet (without its length header)
+        """
+        header = CAPTURE_RECORD.pack(time.time(), direction, conn_id, len(packet))
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(header)
+                self.file.write(packet)
+
+    def write_event(self, conn_id: int, event_name: str):
+        self.write(CAPTURE_EVENT, conn_id, Packet.create_packet(event_name))
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+KERNEL_PACKETS = {"ping", "pong"}  # Handled by Client and Server, not sent to the event registries
+
+CHANNEL_CONTROL = 0  # Heartbeat and connection management: sent first
+CHANNEL_RPC = 1  # Rpcs, requests and the other events (default)
+CHANNEL_STATE = 2  # The world: server_sync, removes, handoff. Big frames are split to let the others through.
+PACKET_CHANNELS = {"ping": CHANNEL_CONTROL, "pong": CHANNEL_CONTROL, "server_stop": CHANNEL_CONTROL,
+                   "client_disconnection": CHANNEL_CONTROL, "handoff_ack": CHANNEL_CONTROL,
+                   "server_sync": CHANNEL_STATE, "remove_ro": CHANNEL_STATE, "join_complete": CHANNEL_STATE,
+                   "handoff": CHANNEL_STATE}  # Same channel: same order (a remove can't pass the spawn of its ro)
+FRAGMENT_SIZE = 16 * 1024  # Max payload of a fragment
+FRAGMENT_FLAG = 0x80000000  # Set into the length header of a fragment
+FRAGMENT_HEADER = struct.Struct("!BB")  # channel, is the last fragment
+
+
+class ChannelSender:
+    """
+    - Send the frames of a connection by priority of channel: a frame bigger than FRAGMENT_SIZE is sent in fragments,
+    and the frames of the channels with a higher priority are sent between its fragments
+    - The frames of a channel keep their order
+    - send() returns once the frame is written into the socket (like sendall)
+    """
+
+    def __init__(self, sock: socket.socket, fragment_size: int = None):
+        """
+        :param sock: The socket (or a ShmRingSocket)
+        :param fragment_size: The max payload of a fragment (by default FRAGMENT_SIZE)
+        """
+        self.sock = sock
+        self.fragment_size = fragment_size or FRAGMENT_SIZE
+        self.queues: list[deque[list]] = [deque() for _ in range(CHANNEL_STATE + 1)]
+        self.condition = threading.Condition()
+        self.is_sending = False  # A thread is sending the queues
+
+    def send(self, frame: bytes, channel: int = CHANNEL_RPC):
+        """
+        Send a frame (see Packet.create_frame)
+        :param frame: The frame
+        :param channel: Its channel
+        """
+        entry = [frame, 0, False, None]  # frame, bytes of the payload sent, done, error
+        with self.condition:
+            if not self.is_sending and len(frame) - 4 <= self.fragment_size and not any(self.queues):
+                self.is_sending = True  # Nothing to interleave: sent as is
+                entry = None
+            else:
+                self.queues[channel].append(entry)
+                while not entry[2] and self.is_sending:
+                    self.condition.wait()
+                if entry[2]:  # Sent by another thread
+                    if entry[3] is not None:
+                        raise entry[3]
+                    return
+                self.is_sending = True
+
+        try:
+            if entry is None:
+                self.sock.sendall(frame)
+            else:
+                self._send_queues(entry)
+        finally:
+            with self.condition:
+                self.is_sending = False
+                self.condition.notify_all()
+        if entry is not None and entry[3] is not None:
+            raise entry[3]
+
+    def try_send(self, frame: bytes, channel: int = CHANNEL_RPC) -> bool:
+        """
+        Send a small frame only if it is sent at once: nothing else is being sent and the socket has room for it
+        :param frame: The frame (not fragmented)
+        :param channel: Its channel
+        :return: False if the frame was not sent
+        """
+        with self.condition:
+            if self.is_sending or any(self.queues) or not can_send_now(self.sock, len(frame)):
+                return False
+            self.is_sending = True
+        try:
+            self.sock.sendall(frame)
+        finally:
+            with self.condition:
+                self.is_sending = False
+                self.condition.notify_all()
+        return True
+
+    def _send_queues(self, own: list):
+        """Send the queued frames, the highest priority first, until the frame of this thread is sent"""
+        while not own[2]:
+            with self.condition:
+                queue = next(queue for queue in self.queues if queue)
+                entry = queue[0]
+                frame, offset = entry[0], entry[1]
+                payload_size = len(frame) - 4
+            try:
+                if offset == 0 and payload_size <= self.fragment_size:
+                    self.sock.sendall(frame)
+                    offset = payload_size
+                else:
+                    end = min(offset + self.fragment_size, payload_size)
+                    chunk = memoryview(frame)[4 + offset:4 + end]
+                    self.sock.sendall(struct.pack("!I", FRAGMENT_FLAG | (FRAGMENT_HEADER.size + len(chunk)))
+                                      + FRAGMENT_HEADER.pack(self.queues.index(queue), end == payload_size)
+                                      + chunk)
+                    offset = end
+            except Exception as e:  # The connection is broken: all the waiting frames fail
+                with self.condition:
+                    for waiting in self.queues:
+                        for failed in waiting:
+                            failed[2], failed[3] = True, e
+                        waiting.clear()
+                    self.condition.notify_all()
+                return
+            with self.condition:
+                entry[1] = offset
+                if offset == payload_size:
+                    queue.popleft()
+                    entry[2] = True
+                    self.condition.notify_all()
+
+
+class FrameReader:
+    """
+    Read the packets of a connection, the fragments of ChannelSender are put back together
+    """
+
+    def __init__(self, sock: socket.socket):
+        """
+        :param sock: The socket (or a ShmRingSocket)
+        """
+        self.sock = sock
+        self.fragments: dict[int, bytearray] = {}  # channel -> payload received
+        self.wire_size = 0  # Bytes read for the last packet (headers included)
+
+    def read_packet(self) -> bytes:
+        """
+        :return: The next whole packet (blocking)
+        """
+        self.wire_size = 0
+        while True:
+            length = struct.unpack("!I", Packet.recv_exact(self.sock, 4))[0]
+            if not length & FRAGMENT_FLAG:
+                self.wire_size += 4 + length
+                return Packet.recv_exact(self.sock, length)
+            length &= ~FRAGMENT_FLAG
+            fragment = Packet.recv_exact(self.sock, length)
+            self.wire_size += 4 + length
+            channel, is_last = FRAGMENT_HEADER.unpack_from(fragment)
+            payload = self.fragments.setdefault(channel, bytearray())
+            payload += memoryview(fragment)[FRAGMENT_HEADER.size:]
+            if is_last:
+                del self.fragments[channel]
+                return bytes(payload)
+
+
+class ConnectionStats:
+    """
+    Liveness and round trip time of a connection. The RTT is smoothed like TCP (RFC 6298).
+    """
+
+    def __init__(self):
+        self.last_recv = time.monotonic()  # Any frame received proves that the peer is alive
+        self.last_ping = 0.0
+        self.rtt: float = None  # Smoothed RTT in seconds (None before the first pong)
+        self.jitter: float = None  # Smoothed deviation of the RTT in seconds
+        self.buckets: dict[str, RateLimit] = {}  # Rate limit key -> bucket of this connection
+        self.violations: dict[str, int] = {}  # Rate limit key -> frames over the limit
+        self.coalesced: dict[str, tuple[partial, bool]] = {}  # Rate limit key -> (last frame over the limit,
+        # include_connection) of LimitAction.COALESCE
+
+    def add_rtt_sample(self, rtt: float):
+        if self.rtt is None:
+            self.rtt = rtt
+            self.jitter = rtt / 2
+        else:
+            self.jitter = 0.75 * self.jitter + 0.25 * abs(self.rtt - rtt)
+            self.rtt = 0.875 * self.rtt + 0.125 * rtt
+
+    def silence(self) -> float:
+        """:return: Seconds since the last frame received"""
+        return time.monotonic() - self.last_recv
+
+    def to_dict(self) -> dict:
+        return {"rtt_ms": self.rtt * 1000 if self.rtt is not None else None,
+                "jitter_ms": self.jitter * 1000 if self.jitter is not None else None,
+                "silence_s": self.silence(),
+                "rate_limited": dict(self.violations)}
+
+
+class LimitAction(Enum):
+    DROP = 1  # The frames over the limit are ignored
+    COALESCE = 2  # Only the last frame over the limit is kept, and handled when the bucket has a token again
+    DISCONNECT = 3  # The client is disconnected
+
+
+class RateLimit:
+    """
+    A token bucket: rate tokens per second, up to burst tokens. A frame takes a token.
+    """
+
+    def __init__(self, rate: float, burst: int = None, action: LimitAction = LimitAction.DROP):
+        """
+        :param rate: Frames per second allowed
+        :param burst: Frames allowed at once (by default one second of frames)
+        :param action: What to do with the frames over the limit
+        """
+        self.rate = rate
+        self.burst = burst or max(1, math.ceil(rate))
+        self.action = action
+        self.tokens = float(self.burst)
+        self.last = time.monotonic()
+
+    def copy(self) -> "RateLimit":
+        """:return: A full bucket with the same settings (each client has its own buckets)"""
+        return RateLimit(self.rate, self.burst, self.action)
+
+    def refill(self):
+        """Add the tokens earned since the last refill"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def take(self) -> bool:
+        """
+        :return: True if a token was taken
+        """
+        self.refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """:return: Seconds before the next token"""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+CONNECTION_LIMIT = "*"  # Key of the rate limit of all the frames of a client (see Server.set_rate_limit)
+
+
 class Client:
     """
     - A class that connect to a Server
     """
+    HEARTBEAT_INTERVAL = 1.0  # Seconds between two pings (None: no heartbeat)
+    HEARTBEAT_TIMEOUT = 10.0  # The connection is closed when the server is silent for longer (None: never)
 
-    def __init__(self, ip="127.0.0.1", port=8080):
+    def __init__(self, ip="127.0.0.1", port=8080, unix_path: str = None, shm_ring=False):
         """
         :param ip: Ip server's
         :param port: Port server
+        :param unix_path: Connect to a server of the same machine with its Unix socket (see Server.start_local_server)
+        :param shm_ring: With unix_path, exchange the frames through shared memory rings (lowest latency)
         """
         self.port = port
         self.ip = ip
+        self.unix_path = unix_path
+        self.shm_ring = shm_ring
         self.client: socket.socket = None
         self.is_connected = False
+        self.frames_in = self.frames_out = self.bytes_in = self.bytes_out = 0  # Traffic counters
+        self.capture: PacketCapture = None
+        self.event_registry = client_event_registry  # Set by the ReverbWorld of the connection
+        self.local_port: int = None  # Port of the connection (id given by the client for a local connection)
+        self.stats = ConnectionStats()
+        self.sender: ChannelSender = None
+
+    def start_capture(self, path: str):
+        """
+        Record all the packets sent and received into a capture file (see pyreverb.reverb_replay)
+        :param path: The path of the capture file
+        """
+        self.capture = PacketCapture(path)
+
+    def stop_capture(self):
+        if self.capture:
+            self.capture.close()
+            self.capture = None
 
     def connect(self):
         """
@@ -220,47 +1274,90 @@ class Client:
         :return: True if the connection succeeds else False
         """
         if not self.is_connected:
-            self.client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.client = socket.socket(socket.AF_UNIX if self.unix_path else socket.AF_INET, socket.SOCK_STREAM)
             try:
-                self.client.connect((self.ip, self.port))
+                if self.unix_path:
+                    self._connect_local()
+                else:
+                    self.client.connect((self.ip, self.port))
+                    self.local_port = self.client.getsockname()[1]
                 self.is_connected = True
+                self.stats = ConnectionStats()
+                self.sender = ChannelSender(self.client)
+                if self.capture:
+                    self.capture.write_event(self.local_port, "connection")
 
-                threading.Thread(target=self.listen, daemon=True).start()
-                client_event_registry.trigger("connection", self.client)  # Trigger connection event
+                spawn_thread(self.listen)
+                if self.HEARTBEAT_INTERVAL:
+                    spawn_thread(self._heartbeat)
+                self.event_registry.trigger("connection", self.client)  # Trigger connection event
                 return True
-            except ConnectionRefusedError:
+            except (ConnectionRefusedError, FileNotFoundError):
                 Client.print_client("The server is unreachable !")
-                client_event_registry.trigger("connection_refused", self.client)
+                self.event_registry.trigger("connection_refused", self.client)
             except socket.gaierror:
                 Client.print_client("Error with host name or IP unfound")
-                client_event_registry.trigger("ip_not_found", self.client)
+                self.event_registry.trigger("ip_not_found", self.client)
             except TimeoutError:
                 Client.print_client("Connexion TimeOut !")
         return False
+
+    def _connect_local(self):
+        """
+        Connect the Unix socket, send the 'local_hello' (the names of the rings) and receive the 'local_welcome' with
+        the id given by the server to this connection
+        """
+        self.client.connect(self.unix_path)
+        rx = tx = None
+        if self.shm_ring:
+            rx, tx = ShmRing(), ShmRing()
+        self.client.sendall(Packet.create_frame("local_hello", os.getpid(), tx and tx.name, rx and rx.name))
+        self.client.settimeout(5)
+        try:
+            length = struct.unpack("!I", Packet.recv_exact(self.client, 4))[0]
+            name, (self.local_port,) = Packet.decode_packet(Packet.recv_exact(self.client, length))
+        except (ConnectionError, OSError, TypeError, ValueError):
+            if rx:
+                rx.close()
+                tx.close()
+            raise ConnectionRefusedError("The local server refused the 'local_hello' !")
+        self.client.settimeout(None)
+        if self.shm_ring:
+            self.client = ShmRingSocket(self.client, rx, tx, self.client.getpeername())
+
     def listen(self):
         """
         Thread that listens for new content from the server
         """
+        reader = FrameReader(self.client)
         try:
             while self.is_connected:
                 try:
-                    raw_len = Packet.recv_exact(self.client, 4)  # Get the length of the packet
-                    length = struct.unpack("!I", raw_len)[0]
-                    packet = Packet.recv_exact(self.client, length)
+                    packet = reader.read_packet()
                     if packet:
+                        self.frames_in += 1
+                        self.bytes_in += reader.wire_size
+                        if self.capture:
+                            self.capture.write(CAPTURE_IN, self.local_port, packet)
                         packet_name, contents = Packet.decode_packet(packet)
+                        metrics.count_frame("in", packet_name, reader.wire_size)
+                        self.stats.last_recv = time.monotonic()
+                        if packet_name in KERNEL_PACKETS:
+                            self._on_kernel_packet(packet_name, contents)
+                            continue
                         if packet_name == "server_stop":
-                            client_event_registry.trigger(packet_name, self.client,
+                            self.event_registry.trigger(packet_name, self.client,
                                                           *contents)  # Trigger the event linked to the message of the server
                             Client.print_client("Server stopped !")
                             break
-                        client_event_registry.trigger(packet_name, self.client,
+                        self.event_registry.trigger(packet_name, self.client,
                                                       *contents)  # Trigger the event linked to the message of the server
                     else:
-                        Client.print_client("The server send an empty packet ! Closing...")
+                        client_log.warning("The server send an empty packet ! Closing...")
                         break
-                except ConnectionResetError:
-                    Client.print_client("Connection lost !")
+                except (ConnectionError, OSError):
+                    if self.is_connected:  # Else the socket was closed by disconnect()
+                        client_log.warning("Connection lost !")
                     break
                 except Exception as e:
                     raise Exception(f"THIS IS NOT NORMAL:\n{e}")
@@ -268,6 +1365,30 @@ class Client:
         finally:
             self.disconnect()
 
+    def _on_kernel_packet(self, packet_name: str, contents: list):
+        if packet_name == "ping":
+            self.send("pong", *contents)
+        elif packet_name == "pong" and contents:
+            self.stats.add_rtt_sample(time.monotonic() - contents[0])
+            metrics.gauge("rtt_ms", self.stats.rtt * 1000)
+
+    def _heartbeat(self):
+        """Thread that pings the server and closes the connection if the server is silent for too long"""
+        while self.is_connected:
+            time.sleep(self.HEARTBEAT_INTERVAL)
+            if not self.is_connected:
+                break
+            if self.HEARTBEAT_TIMEOUT and self.stats.silence() > self.HEARTBEAT_TIMEOUT:
+                client_log.warning("The server is silent since %.1fs ! Closing...", self.stats.silence())
+                close_connection(self.client)  # The listening thread stops and disconnects
+                break
+            self.send("ping", time.monotonic())
+
+    @property
+    def rtt(self) -> float | None:
+        """:return: The smoothed round trip time to the server in seconds"""
+        return self.stats.rtt
+
     def send(self, packet_name: str, *content):
         """
         Send a content to the server
@@ -275,11 +1396,17 @@ class Client:
         :param content: contents
         """
         if self.is_connected:
-            packet = Packet.create_packet(packet_name, *content)
-            length = len(packet)
-            header = struct.pack('!I', length)
+            frame = Packet.create_frame(packet_name, *content)
             try:
-                self.client.sendall(header + packet)
+                if self.sender is not None:
+                    self.sender.send(frame, PACKET_CHANNELS.get(packet_name, CHANNEL_RPC))
+                else:  # A socket given without connect() (ex: a replay)
+                    self.client.sendall(frame)
+                self.frames_out += 1
+                self.bytes_out += len(frame)
+                metrics.count_frame("out", packet_name, len(frame))
+                if self.capture:
+                    self.capture.write(CAPTURE_OUT, self.local_port, memoryview(frame)[4:])
             except BrokenPipeError:
                 warn("The client has been disconnected during a sending operation!")
             except ConnectionResetError:
@@ -296,9 +1423,10 @@ class Client:
                 self.send("client_disconnection", self.client.getpeername())
             finally:
                 self.is_connected = False
-                client_event_registry.trigger("disconnection", self.client)
+                self.event_registry.trigger("disconnection", self.client)
                 Client.print_client("Client close and disconnect from the server !")
                 self.client.close()  # Close the client
+                self.stop_capture()
 
     @staticmethod
     def print_client(msg):
@@ -306,13 +1434,32 @@ class Client:
         Print a message with client style
         :param msg: the message to print
         """
-        print(f"{Back.BLUE + Fore.RED}[{Fore.RESET}CLIENT{Fore.RED}]{Style.RESET_ALL} {msg}")
+        client_log.info(msg)
+
+
+class ServerMethod:
+    """
+    Method of Server that can also be called on the class, like when it was a staticmethod: Server.send_to(clt, ...)
+    - On the class, it is called on the running Server of the client socket (see Server.of)
+    """
+
+    def __init__(self, func):
+        self.func = func
+        update_wrapper(self, func)
+
+    def __get__(self, instance, owner=None):
+        if instance is not None:
+            return self.func.__get__(instance, owner)
+        return lambda clt, *args, **kwargs: self.func(Server.of(clt), clt, *args, **kwargs)
 
 
 class Server:
     """
     - A class that open a Server
     """
+    RUNNING: "weakref.WeakSet[Server]" = weakref.WeakSet()  # The started servers, see Server.of
+    HEARTBEAT_INTERVAL = 1.0  # Seconds between two pings of each client (None: no heartbeat)
+    HEARTBEAT_TIMEOUT = 10.0  # A client silent for longer is disconnected (None: never)
 
     def __init__(self, host="", port=8080):
         """
@@ -324,6 +1471,42 @@ class Server:
         self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.is_online = False
         self.clients: dict[tuple[str, int], socket.socket] = {}
+        self.detaching: set[tuple[str, int]] = set()  # Clients waiting for their 'handoff_ack'
+        self.connections: dict[tuple[str, int], ConnectionStats] = {}  # addr -> liveness and RTT
+        self.senders: dict[tuple[str, int], ChannelSender] = {}  # addr -> sender of the frames by channel
+        self.rate_limits: dict[str, RateLimit] = {}  # Key (event, rpc or CONNECTION_LIMIT) -> limit of each client
+        self.rate_lock = threading.Lock()
+        self.frames_in = self.frames_out = self.bytes_in = self.bytes_out = 0  # Traffic counters
+        self.capture: PacketCapture = None
+        self.event_registry = server_event_registry  # Set by the ReverbWorld of the connection
+        self.local_server: socket.socket = None
+        self.local_path: str = None
+        self.local_ids = itertools.count(LOCAL_ID_START)  # Never reused: the id is the port of the connection
+
+    def start_capture(self, path: str):
+        """
+        Record all the packets sent and received, and the connections of the clients, into a capture file
+        (see pyreverb.reverb_replay)
+        :param path: The path of the capture file
+        """
+        self.capture = PacketCapture(path)
+
+    def stop_capture(self):
+        if self.capture:
+            self.capture.close()
+            self.capture = None
+
+    @staticmethod
+    def of(clt: socket.socket) -> "Server":
+        """
+        :param clt: A client socket
+        :return: The running Server of this client
+        """
+        addr = clt.getpeername()
+        for server in list(Server.RUNNING):
+            if server.clients.get(addr) is clt:
+                return server
+        raise ConnectionError(f"No running server has the client {addr}")
 
     @staticmethod
     def print_server(msg):
@@ -331,7 +1514,7 @@ class Server:
         Print a message with server style
         :param msg: the message to print
         """
-        print(f"{Back.GREEN + Fore.RED}[{Fore.RESET}SERVER{Fore.RED}]{Style.RESET_ALL} {msg}")
+        server_log.info(msg)
 
     def start_server(self):
         """
@@ -343,22 +1526,205 @@ class Server:
 
         Server.print_server(f"Server online ! Waiting for clients on {self.host}:{self.port}...")
         self.is_online = True
-        threading.Thread(target=self._accept_clients, daemon=True).start()
+        Server.RUNNING.add(self)
+        metrics.add_collector(self.collect_metrics)
+        spawn_thread(self._accept_clients)
+        self.start_heartbeat()
+
+    def start_heartbeat(self):
+        """
+        Start the thread that pings the clients and disconnects the silent ones (called by start_server)
+        """
+        if self.HEARTBEAT_INTERVAL:
+            spawn_thread(self._heartbeat)
+
+    def _heartbeat(self):
+        """Thread of the heartbeat"""
+        while self.is_online:
+            time.sleep(self.HEARTBEAT_INTERVAL)
+            if self.HEARTBEAT_TIMEOUT:
+                for addr, client_socket in list(self.clients.items()):
+                    stats = self.connections.get(addr)
+                    if stats is not None and stats.silence() > self.HEARTBEAT_TIMEOUT:
+                        server_log.warning("The client: %s is silent since %.1fs ! Evicting...", addr, stats.silence())
+                        self.clients.pop(addr, None)  # No more sends
+                        close_connection(client_socket)  # Wakes up its sends and its thread ('client_disconnection')
+            for addr, client_socket in list(self.clients.items()):
+                if addr in self.connections:  # Never blocks: a client that doesn't read can't stop the heartbeat
+                    if not self.send_frame(client_socket, Packet.create_frame("ping", time.monotonic()), "ping",
+                                           block=False):
+                        server_log.debug("The ping of %s is skipped: its send buffer is full", addr)
+
+    def get_rtt(self, addr) -> float | None:
+        """
+        :param addr: The address of the client
+        :return: The smoothed round trip time to the client in seconds (None if unknown)
+        """
+        stats = self.connections.get(addr)
+        return stats.rtt if stats else None
+
+    def set_rate_limit(self, key: str, rate: float, burst: int = None, action: LimitAction = LimitAction.DROP):
+        """
+        - Limit the frames that each client can send
+        - The ping/pong and the disconnection of a client are never limited
+        :param key: The name of an event, the name of an rpc ("Player.walk"), or CONNECTION_LIMIT for all the frames
+        :param rate: Frames per second allowed
+        :param burst: Frames allowed at once (by default one second of frames)
+        :param action: What to do with the frames over the limit
+        """
+        self.rate_limits[key] = RateLimit(rate, burst, action)
+        for stats in list(self.connections.values()):
+            stats.buckets.pop(key, None)
+
+    def check_rate_limit(self, client_socket: socket.socket, key: str, dispatch: partial = None,
+                         include_connection=True) -> bool:
+        """
+        - Take a token of the buckets of a client: the one of the key, and the one of CONNECTION_LIMIT if
+        include_connection (once per frame: _handle_client). No token is taken if one of the buckets is empty.
+        - Over the limit, the violation is counted into its ConnectionStats and its LimitAction is applied
+        :param client_socket: The socket of the client
+        :param key: The name of the event or of the rpc
+        :param dispatch: Handle the frame later (LimitAction.COALESCE). Without it, the frame is dropped.
+        :param include_connection: False for the rpcs into a frame already counted (ex: the rpcs of a batch)
+        :return: True if the frame can be handled now
+        """
+        if not self.rate_limits:
+            return True
+        addr = client_socket.getpeername()
+        stats = self.connections.get(addr)
+        if stats is None:
+            return True
+        with self.rate_lock:
+            buckets = []
+            for limit_key in ((CONNECTION_LIMIT, key) if include_connection else (key,)):
+                limit = self.rate_limits.get(limit_key)
+                if limit is None:
+                    continue
+                bucket = stats.buckets.get(limit_key)
+                if bucket is None:
+                    bucket = stats.buckets[limit_key] = limit.copy()
+                bucket.refill()
+                if bucket.tokens < 1:
+                    self._on_rate_limited(client_socket, addr, stats, key, bucket, dispatch, include_connection)
+                    return False
+                buckets.append(bucket)
+            for bucket in buckets:
+                bucket.tokens -= 1
+        return True
+
+    def _on_rate_limited(self, client_socket, addr, stats: ConnectionStats, key: str, bucket: RateLimit, dispatch,
+                         include_connection: bool):
+        stats.violations[key] = stats.violations.get(key, 0) + 1
+        metrics.count("rate_limited")
+        if bucket.action is LimitAction.DISCONNECT:
+            if self.clients.pop(addr, None) is not None:  # No more sends
+                server_log.warning("The client: %s exceeded the rate limit of '%s' ! Disconnecting...", addr, key)
+                close_connection(client_socket)  # Its thread triggers 'client_disconnection'
+        elif bucket.action is LimitAction.COALESCE and dispatch is not None:
+            is_scheduled = key in stats.coalesced
+            stats.coalesced[key] = (dispatch, include_connection)
+            if not is_scheduled:
+                timer = threading.Timer(bucket.wait_time(), contextvars.copy_context().run,
+                                        args=(self._flush_coalesced, client_socket, addr, key))
+                timer.daemon = True
+                timer.start()
+
+    def _flush_coalesced(self, client_socket, addr, key: str):
+        """Handle the last frame kept by LimitAction.COALESCE once the bucket has a token"""
+        stats = self.connections.get(addr)
+        if stats is None or not self.is_online:
+            return
+        with self.rate_lock:
+            dispatch, include_connection = stats.coalesced.pop(key, (None, True))
+        if dispatch is not None and self.check_rate_limit(client_socket, key, dispatch, include_connection):
+            dispatch()
+
+    def start_local_server(self, path: str = None):
+        """
+        - Call after start_server
+        - Also listen on a Unix socket for the clients of the same machine (see Client(unix_path=...)): no TCP stack
+        - Their address is ("local", id), the id is used as their port
+        :param path: The path of the socket (by default local_socket_path(port))
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unsupported OS! The local transport needs Unix sockets.")
+        self.local_path = path or local_socket_path(self.port)
+        if os.path.exists(self.local_path):
+            os.unlink(self.local_path)  # Left by a server that crashed
+        self.local_server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.local_server.bind(self.local_path)
+        self.local_server.listen()
+        Server.print_server(f"Waiting for local clients on {self.local_path}...")
+        spawn_thread(self._accept_local_clients)
+
+    def _accept_local_clients(self):
+        """Thread that accepts the clients of the Unix socket, each one does its 'local_hello' into its own thread"""
+        try:
+            while self.is_online:
+                client_socket, _ = self.local_server.accept()
+                spawn_thread(self._local_handshake, client_socket)
+        except OSError:
+            pass
+
+    def _local_handshake(self, client_socket: socket.socket):
+        """Read the 'local_hello' of a local client, give it its id with the 'local_welcome' then add it"""
+        try:
+            client_socket.settimeout(2)
+            length = struct.unpack("!I", Packet.recv_exact(client_socket, 4))[0]
+            name, (pid, rx_name, tx_name) = Packet.decode_packet(Packet.recv_exact(client_socket, length))
+            local_id = next(self.local_ids)
+            client_socket.sendall(Packet.create_frame("local_welcome", local_id))
+            client_socket.settimeout(None)
+            addr = ("local", local_id)
+            if rx_name:
+                track = pid == os.getpid()  # Else the client unlinks the rings
+                clt = ShmRingSocket(client_socket, ShmRing(rx_name, track=track), ShmRing(tx_name, track=track), addr)
+            else:
+                clt = PeerSocket(client_socket, addr)
+        except (ConnectionError, OSError, TypeError, ValueError):
+            server_log.warning("A local client sent an invalid 'local_hello' !")
+            client_socket.close()
+            return
+        if self.is_online:
+            self.add_client(clt, addr)
+        else:
+            clt.close()
+
+    def collect_metrics(self, m: Metrics):
+        """
+        Refresh the gauges of the server (called by metrics.snapshot())
+        """
+        m.gauge("clients", len(self.clients))
+        for addr, client_socket in list(self.clients.items()):
+            connection = m.get_connection(addr)
+            if connection is None:
+                continue
+            connection["outbound_queue_bytes"] = get_outbound_queue_size(client_socket)
+            stats = self.connections.get(addr)
+            if stats:
+                connection.update(stats.to_dict())
 
     def stop_server(self):
         """
         Stop the server
         """
         self.is_online = False
+        Server.RUNNING.discard(self)
+        metrics.remove_collector(self.collect_metrics)
         clts = list(self.clients.values())  # To avoid bugs
         self.send_to_all("server_stop")
         for client in clts:
-            Server.print_server(f"The client: {client.getpeername()} is disconnect !")
+            server_log.info("The client: %s is disconnect !", client.getpeername())
             client.close()
         Server.print_server("All clients disconnected.")
 
         if self.server:
             self.server.close()
+        if self.local_server:
+            self.local_server.close()
+            if os.path.exists(self.local_path):
+                os.unlink(self.local_path)
+        self.stop_capture()
         Server.print_server("Server closed !")
 
     def _accept_clients(self):
@@ -366,9 +1732,7 @@ class Server:
         try:
             while self.is_online:
                 client_socket, addr = self.server.accept()
-                self.clients[addr] = client_socket
-                server_event_registry.trigger("client_connection", client_socket)
-                threading.Thread(target=self._handle_client, args=(client_socket, addr), daemon=True).start()
+                self.add_client(client_socket, addr)
         except KeyboardInterrupt:
             self.stop_server()
         except OSError:
@@ -376,36 +1740,91 @@ class Server:
         finally:
             Server.print_server("Server stop listening to new clients !")
 
+    def add_client(self, client_socket: socket.socket, addr, event_name="client_connection"):
+        """
+        Add a connected client to the server and start listening to it
+        :param client_socket: The socket of the client
+        :param addr: The address of the client
+        :param event_name: The event triggered for this new client
+        """
+        if not isinstance(client_socket, (PeerSocket, ShmRingSocket)):
+            client_socket = PeerSocket(client_socket)
+        self.clients[addr] = client_socket
+        self.connections[addr] = ConnectionStats()
+        self.senders[addr] = ChannelSender(client_socket)
+        metrics.add_connection(addr)
+        if self.capture:
+            self.capture.write_event(addr[1], event_name)
+        self.event_registry.trigger(event_name, client_socket)
+        spawn_thread(self._handle_client, client_socket, addr)
+
+    def detach_client(self, addr):
+        """
+        Stop sending to a client and send it a 'handoff' packet. When its 'handoff_ack' is received the listening thread
+        stops without closing the socket and the 'client_detached' event is triggered: the socket can then be given to
+        another process.
+        :param addr: The address of the client
+        """
+        client_socket = self.clients.pop(addr)
+        self.detaching.add(addr)
+        self.send_to(client_socket, "handoff")
+
     def _handle_client(self, client_socket, addr):
         """Thread that triggers event from packet recv from clients"""
+        reader = FrameReader(client_socket)
         while self.is_online:
             try:
-                raw_len = Packet.recv_exact(client_socket, 4)  # Get the length of the packet
-                length = struct.unpack("!I", raw_len)[0]
-                packet = Packet.recv_exact(client_socket, length)
+                packet = reader.read_packet()
                 if packet:
+                    self.frames_in += 1
+                    self.bytes_in += reader.wire_size
+                    if self.capture:
+                        self.capture.write(CAPTURE_IN, addr[1], packet)
                     packet_name, contents = Packet.decode_packet(packet)
+                    metrics.count_frame("in", packet_name, reader.wire_size, addr)
+                    stats = self.connections.get(addr)
+                    if stats:
+                        stats.last_recv = time.monotonic()
 
-                    if packet_name == "client_disconnection":
-                        server_event_registry.trigger(packet_name, client_socket, *contents, threading_event=False)
+                    if packet_name == "ping":
+                        self.send_to(client_socket, "pong", *contents)
+                    elif packet_name == "pong":
+                        if stats and contents:
+                            stats.add_rtt_sample(time.monotonic() - contents[0])
+                    elif packet_name == "client_disconnection":
+                        self.event_registry.trigger(packet_name, client_socket, *contents, threading_event=False)
                         break
-                    else:
-                        server_event_registry.trigger(packet_name, client_socket, *contents)
+                    elif packet_name == "handoff_ack" and addr in self.detaching:
+                        self.detaching.discard(addr)
+                        self.connections.pop(addr, None)
+                        self.senders.pop(addr, None)
+                        self.event_registry.trigger("client_detached", client_socket, threading_event=False)
+                        return  # The socket belongs to someone else now
+                    elif not self.rate_limits or self.check_rate_limit(
+                            client_socket, packet_name,
+                            partial(self.event_registry.trigger, packet_name, client_socket, *contents)):
+                        self.event_registry.trigger(packet_name, client_socket, *contents)
                 else:
-                    Server.print_server(
-                        f"A packet from: {addr} has been send with no data ! This is illegal closing the listening thread and the communication !")
+                    server_log.warning("A packet from: %s has been send with no data ! This is illegal closing the listening "
+                                       "thread and the communication !", addr)
                     break
-            except ConnectionResetError:
-                server_event_registry.trigger("client_disconnection", client_socket, threading_event=False)
-                Server.print_server(f"The client at address: {addr} has been disconnected ! This is an anomaly.")
+            except (ConnectionError, OSError):
+                if self.is_online:
+                    server_log.warning("The client at address: %s has been disconnected ! This is an anomaly.", addr)
+                    if self.capture:
+                        self.capture.write_event(addr[1], "client_disconnection")
+                    self.event_registry.trigger("client_disconnection", client_socket, threading_event=False)
                 break
             except Exception as e:
                 print(f"THIS IS NOT NORMAL: {e}")
 
         if addr in self.clients:
             self.clients.pop(addr)
+        self.connections.pop(addr, None)
+        self.senders.pop(addr, None)
+        metrics.forget_connection(addr)
         client_socket.close()
-        Server.print_server(f"The client: {addr} is disconnect !")
+        server_log.info("The client: %s is disconnect !", addr)
 
     def send_to_all(self, packet_name, *contents):
         """
@@ -413,22 +1832,50 @@ class Server:
         :param packet_name: The name of the packet/event
         :param contents: Contents
         """
-        for client in self.clients.values():
-            self.send_to(client, packet_name, *contents)
+        frame = Packet.create_frame(packet_name, *contents)  # Encoded once for all the clients
+        for client in list(self.clients.values()):  # Avoiding: "RuntimeError: dictionary changed size during iteration"
+            self.send_frame(client, frame, packet_name)
 
-    @staticmethod
-    def send_to(clt: socket.socket, packet_name, *contents):
-        packet = Packet.create_packet(packet_name, *contents)
-        length = len(packet)
-        header = struct.pack('!I', length)
+    @ServerMethod
+    def send_to(self, clt: socket.socket, packet_name, *contents):
+        self.send_frame(clt, Packet.create_frame(packet_name, *contents), packet_name)
+
+    @ServerMethod
+    def send_frame(self, clt: socket.socket, frame: bytes, packet_name="frame", block=True) -> bool:
+        """
+        Send an already encoded frame (see Packet.create_frame) to a client
+        :param clt: The client socket
+        :param frame: The frame
+        :param packet_name: The name of the packet into the frame (for the metrics and its channel)
+        :param block: If False, the frame is not sent when it can't be sent at once (see ChannelSender.try_send)
+        :return: True if the frame was sent
+        """
         try:
-            clt.sendall(header + packet)
+            addr = clt.getpeername()
+            sender = self.senders.get(addr)
+            channel = PACKET_CHANNELS.get(packet_name, CHANNEL_RPC)
+            if sender is not None:
+                if block:
+                    sender.send(frame, channel)
+                elif not sender.try_send(frame, channel):
+                    return False
+            elif block or can_send_now(clt, len(frame)):
+                clt.sendall(frame)
+            else:
+                return False
+            self.frames_out += 1
+            self.bytes_out += len(frame)
+            metrics.count_frame("out", packet_name, len(frame), addr)
+            if self.capture:
+                self.capture.write(CAPTURE_OUT, addr[1], memoryview(frame)[4:])
+            return True
         except BrokenPipeError:
             warn(f"The client was disconnect during a sending operation: {clt.getpeername()}")
         except OSError:
             warn("The server is certainly closed...")
         except ConnectionResetError:
             warn(f"A client was disconnect during a sending operation!")
+        return False
 
 
 # Basic Event Registry
@@ -436,12 +1883,12 @@ class Server:
 # SERVER EVENTS
 @server_event_registry.on_event("client_disconnection")
 def on_client_disconnect(clt, *args):
-    Server.print_server(f"The client: {clt.getpeername()} disconnect itself ! (Client Side)")
+    server_log.info("The client: %s disconnect itself ! (Client Side)", clt.getpeername())
 
 
 @server_event_registry.on_event("client_connection")
 def on_client_connect(clt, *args):
-    Server.print_server(f"Client connected on: {clt.getpeername()} !")
+    server_log.info("Client connected on: %s !", clt.getpeername())
 
 
 # CLIENT EVENTS
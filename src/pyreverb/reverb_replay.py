@@ -0,0 +1,145 @@
+import argparse
+import importlib
+import mmap
+
+from . import reverb
+from .reverb import *
+
+
+class ReplaySocket:
+    """
+    Stand-in for the socket of a captured connection: it has the same peer port (belonging_membership) and drops
+    everything sent to it
+    """
+
+    def __init__(self, conn_id: int):
+        self.conn_id = conn_id
+
+    def getpeername(self):
+        return "replay", self.conn_id
+
+    def sendall(self, data):
+        pass
+
+    def close(self):
+        pass
+
+
+def read_capture(path: str, directions=(CAPTURE_IN, CAPTURE_OUT, CAPTURE_EVENT)):
+    """
+    Read a capture file (see Server.start_capture / Client.start_capture) without copying it into memory
+    :param path: The path of the capture file
+    :param directions: The kinds of records to yield
+    :return: A generator of (timestamp, direction, conn_id, packet)
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= len(CAPTURE_MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+                raise ValueError(f"{path} is not a PyReverb capture file!")
+            offset = len(CAPTURE_MAGIC)
+            while offset + CAPTURE_RECORD.size <= len(data):
+                timestamp, direction, conn_id, length = CAPTURE_RECORD.unpack_from(data, offset)
+                offset += CAPTURE_RECORD.size
+                if offset + length > len(data):
+                    warn(f"The last record of {path} is truncated !")
+                    break
+                if direction in directions:
+                    yield timestamp, direction, conn_id, data[offset:offset + length]
+                offset += length
+
+
+def replay_capture(path: str, side: ReverbSide = ReverbSide.SERVER, speed: float = 0.0) -> dict:
+    """
+    - Feed the received packets of a capture back into the event registry of the side, one after the other into this
+    thread (the handlers are not threaded: the replay is deterministic)
+    - The ReverbObject classes of the game must be imported before
+    - What the handlers send is dropped
+    :param path: The path of the capture file
+    :param side: The side that recorded the capture
+    :param speed: 1 for the recorded speed, 2 for twice faster... 0 for as fast as possible
+    :return: The report: frames per second, and the decode/apply time of each event
+    """
+    ReverbManager.REVERB_SIDE = side
+    if side == ReverbSide.SERVER:
+        registry = server_event_registry
+        ReverbManager.REVERB_CONNECTION = Server(port=0)
+    else:
+        registry = client_event_registry
+        ReverbManager.REVERB_CONNECTION = Client()
+        ReverbManager.REVERB_CONNECTION.is_connected = True  # Sends are dropped by the ReplaySocket
+        ReverbManager.REVERB_CONNECTION.client = ReplaySocket(0)
+        ReverbManager.REVERB_CONNECTION.sender = ChannelSender(ReverbManager.REVERB_CONNECTION.client)
+
+    sockets: dict[int, ReplaySocket] = {}
+    events: dict[str, list[float]] = {}  # name -> [frames, decode, apply]
+    frames = 0
+    first_timestamp = None
+    start = time.perf_counter()
+    for timestamp, direction, conn_id, packet in read_capture(path, (CAPTURE_IN, CAPTURE_EVENT)):
+        if speed:
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            delay = (timestamp - first_timestamp) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        decode_start = time.perf_counter()
+        decoded = Packet.decode_packet(packet)
+        apply_start = time.perf_counter()
+        if decoded is None:
+            continue
+        packet_name, contents = decoded
+        if packet_name in KERNEL_PACKETS:
+            continue
+        clt = sockets.get(conn_id)
+        if clt is None:
+            clt = sockets[conn_id] = ReplaySocket(conn_id)
+        try:
+            registry.trigger(packet_name, clt, *contents, threading_event=False)
+        except Exception as e:
+            warn(f"The replay of '{packet_name}' failed: {e.__class__.__name__}: {e}")
+        end = time.perf_counter()
+
+        frames += 1
+        stats = events.get(packet_name)
+        if stats is None:
+            stats = events[packet_name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += apply_start - decode_start
+        stats[2] += end - apply_start
+    elapsed = time.perf_counter() - start
+
+    ReverbManager.REVERB_SIDE = None  # No log saving at exit
+    return {
+        "frames": frames,
+        "duration_s": elapsed,
+        "frames_per_s": frames / elapsed if elapsed else None,
+        "ros": ReverbManager.REVERB_OBJECTS.alive_count(),
+        "events": {name: {"frames": count, "decode_ms": decode * 1000, "apply_ms": apply * 1000,
+                          "mean_apply_us": apply / count * 1e6}
+                   for name, (count, decode, apply) in sorted(events.items(), key=lambda item: -item[1][2])},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a PyReverb capture file into the event registries")
+    parser.add_argument("capture", help="The capture file")
+    parser.add_argument("--side", choices=["server", "client"], default="server", help="The side that recorded it")
+    parser.add_argument("--speed", type=float, default=0, help="1 for the recorded speed, 0 for as fast as possible")
+    parser.add_argument("--import", dest="modules", action="append", default=[],
+                        help="Module that defines the ReverbObjects and the events of the game (repeatable)")
+    parser.add_argument("--json", help="Write the report into this file")
+    cli_args = parser.parse_args()
+
+    reverb.set_verbose(0)
+    ReverbManager.REVERB_SIDE = ReverbSide.SERVER if cli_args.side == "server" else ReverbSide.CLIENT
+    for module in cli_args.modules:
+        importlib.import_module(module)
+    report = replay_capture(cli_args.capture, ReverbManager.REVERB_SIDE, cli_args.speed)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if cli_args.json:
+        with open(cli_args.json, "w") as f:
+            f.write(text)
@@ -0,0 +1,261 @@
+import itertools
+import multiprocessing
+
+from .reverb import *
+
+SHARD_MESSAGE_SIZE = 1 << 20  # Max size of a message between the ShardServer and a shard
+
+
+def send_shard_message(ctl: socket.socket, name: str, *contents, fd: int = None):
+    """
+    Send a message (and optionally a file descriptor) on a shard control socket
+    :param ctl: The control socket (AF_UNIX, SOCK_SEQPACKET)
+    :param name: Name of the message
+    :param contents: The contents to send
+    :param fd: A file descriptor to give to the other process (ex: a client socket)
+    """
+    socket.send_fds(ctl, [Packet.create_packet(name, *contents)], [fd] if fd is not None else [])
+
+
+def recv_shard_message(ctl: socket.socket):
+    """
+    Receive a message from a shard control socket
+    :param ctl: The control socket
+    :return: The name, the contents and the file descriptor (or None) of the message
+    """
+    packet, fds, _, _ = socket.recv_fds(ctl, SHARD_MESSAGE_SIZE, 1)
+    if not packet:
+        raise ConnectionError("The shard control socket is close...")
+    name, contents = Packet.decode_packet(packet)
+    return name, contents, (fds[0] if fds else None)
+
+
+def round_robin_router():
+    """
+    :return: A router that gives the clients to the shards one after the other
+    """
+    counter = itertools.count()
+    return lambda addr, shard_count: next(counter) % shard_count
+
+
+class ShardWorker(Server):
+    """
+    - The Server of a shard process
+    - It does not listen: its clients are given by the ShardServer, or by another shard with a handoff
+    """
+
+    def __init__(self, ctl: socket.socket, shard_index: int, shard_count: int):
+        """
+        :param ctl: The control socket linked to the ShardServer
+        :param shard_index: The index of this shard
+        :param shard_count: The number of shards
+        """
+        super().__init__(port=0)
+        self.server.close()  # Not listening
+        self.ctl = ctl
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.handoff_targets: dict[tuple[str, int], int] = {}  # addr -> shard of the clients being handed off
+
+    def start_server(self):
+        """
+        Start listening to the ShardServer
+        """
+        self.is_online = True
+        spawn_thread(self._listen_ctl)
+        self.start_heartbeat()
+        Server.print_server(f"Shard {self.shard_index}/{self.shard_count} online !")
+
+    def _listen_ctl(self):
+        """Thread that handles the messages of the ShardServer"""
+        try:
+            while self.is_online:
+                name, contents, fd = recv_shard_message(self.ctl)
+                if name == "shard_adopt_client":
+                    client_socket = socket.socket(fileno=fd)
+                    self.add_client(client_socket, client_socket.getpeername())
+                elif name == "shard_handoff_client":
+                    client_socket = socket.socket(fileno=fd)
+                    ReverbManager.on_client_connect(client_socket)  # Stream the world of this shard
+                    self.add_client(client_socket, client_socket.getpeername(), event_name="client_handoff")
+                elif name == "shard_migrate_ro":
+                    ReverbManager.adopt_reverb_object(contents[1])
+                elif name == "shard_stop":
+                    self.stop_server()
+                    os._exit(0)
+        except (ConnectionError, OSError):
+            Server.print_server(f"Shard {self.shard_index} lost the ShardServer !")
+            self.stop_server()
+            os._exit(1)
+
+    def migrate_reverb_object(self, uid: str, shard_index: int):
+        """
+        - Move a ro to another shard with its SyncVars
+        - on_destroy_from_server is called on this shard and on_init_from_server on the other one
+        :param uid: The uid of the ro
+        :param shard_index: The index of the shard
+        """
+        ro = ReverbManager.get_reverb_object(uid)
+        ro_data = ro.pack(only_sync_vars=False)
+        ReverbManager.remove_reverb_object(uid)
+        send_shard_message(self.ctl, "shard_forward", shard_index, "shard_migrate_ro", ro_data)
+
+    def migrate_client(self, addr, shard_index: int):
+        """
+        - Move a client and all its ros to another shard
+        - The client keeps its connection, it receives the world of the new shard
+        - The 'client_handoff' event is triggered on the new shard
+        :param addr: The address of the client
+        :param shard_index: The index of the shard
+        """
+        self.handoff_targets[addr] = shard_index
+        self.detach_client(addr)
+
+    def finish_client_handoff(self, client_socket: socket.socket):
+        """
+        Called when the client acknowledged the handoff: send its ros then its socket to the new shard
+        :param client_socket: The socket of the client
+        """
+        addr = client_socket.getpeername()
+        shard_index = self.handoff_targets.pop(addr)
+        for ro in ReverbManager.get_reverb_objects_by_belonging_membership(addr[1]):
+            self.migrate_reverb_object(ro.uid, shard_index)
+        send_shard_message(self.ctl, "shard_forward", shard_index, "shard_handoff_client", fd=client_socket.fileno())
+        client_socket.close()
+        server_log.info("The client: %s is handed off to the shard %s !", addr, shard_index)
+
+
+@server_event_registry.on_event("client_detached")
+def on_client_detached(clt: socket.socket, *args):
+    if isinstance(ReverbManager.REVERB_CONNECTION, ShardWorker):
+        ReverbManager.REVERB_CONNECTION.finish_client_handoff(clt)
+
+
+def run_shard(shard_main, shard_index: int, shard_count: int, ctl: socket.socket):
+    """
+    Entry point of a shard process
+    :param shard_main: The function that runs the game of the shard, called with the ShardWorker
+    :param shard_index: The index of this shard
+    :param shard_count: The number of shards
+    :param ctl: The control socket linked to the ShardServer
+    """
+    worker = ShardWorker(ctl, shard_index, shard_count)
+    ReverbManager.REVERB_SIDE = ReverbSide.SERVER
+    ReverbManager.REVERB_CONNECTION = worker
+    worker.start_server()
+    shard_main(worker)
+
+
+class ShardServer:
+    """
+    - Split the world into many processes (shards) behind one address: the clients see only one Server
+    - Each shard runs its own ReverbManager into its own process (no GIL shared between shards)
+    - Only on Unix: the sockets of the clients are given to the shards
+    """
+
+    def __init__(self, shard_main, shard_count=2, host="", port=8080, router=None):
+        """
+        :param shard_main: A top level function called into each shard process with its ShardWorker
+        (ex: register the events and run ReverbManager.run_tick_loop). shard_worker.shard_index gives the shard.
+        :param shard_count: The number of shard processes
+        :param host: The ip. Let it him by default
+        :param port: The listen port!
+        :param router: A function(addr, shard_count) -> shard_index that chooses the shard of a new client
+        (by default one after the other)
+        """
+        if not hasattr(socket, "send_fds"):
+            raise OSError("Unsupported OS! Sharding needs Unix sockets.")
+        self.shard_main = shard_main
+        self.shard_count = shard_count
+        self.host = host
+        self.port = port
+        self.router = router or round_robin_router()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.shards: list[socket.socket] = []
+        self.processes: list[multiprocessing.Process] = []
+        self.is_online = False
+
+    def start_server(self):
+        """
+        Start the shard processes then the server
+        """
+        Server.print_server(f"Starting {self.shard_count} shards...")
+        for shard_index in range(self.shard_count):
+            ctl, shard_ctl = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            process = multiprocessing.Process(target=run_shard,
+                                              args=(self.shard_main, shard_index, self.shard_count, shard_ctl),
+                                              daemon=True)
+            process.start()
+            shard_ctl.close()
+            self.shards.append(ctl)
+            self.processes.append(process)
+
+        self.is_online = True
+        for shard_index in range(self.shard_count):
+            threading.Thread(target=self._relay_shard, args=(shard_index,), daemon=True).start()
+
+        self.server.bind((self.host, self.port))
+        self.server.listen()
+        Server.print_server(f"Server online ! Waiting for clients on {self.host}:{self.port}...")
+        threading.Thread(target=self._accept_clients, daemon=True).start()
+
+    def serve_forever(self):
+        """
+        - Start the server (if not started) then block until all the shard processes end or Ctrl+C
+        - start_server returns at once: the shards are daemon processes, they die with this process
+        """
+        if not self.is_online:
+            self.start_server()
+        try:
+            for process in self.processes:
+                process.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.is_online:
+                self.stop_server()
+
+    def stop_server(self):
+        """
+        Stop the server and all the shards
+        """
+        self.is_online = False
+        self.server.close()
+        for ctl in self.shards:
+            try:
+                send_shard_message(ctl, "shard_stop")
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(timeout=3)
+            if process.is_alive():
+                process.terminate()
+        Server.print_server("Server and shards closed !")
+
+    def _accept_clients(self):
+        """Thread that gives the new clients to the shards"""
+        try:
+            while self.is_online:
+                client_socket, addr = self.server.accept()
+                shard_index = self.router(addr, self.shard_count)
+                send_shard_message(self.shards[shard_index], "shard_adopt_client", fd=client_socket.fileno())
+                client_socket.close()  # The shard has its own copy
+        except OSError:
+            pass
+        finally:
+            Server.print_server("Server stop listening to new clients !")
+
+    def _relay_shard(self, shard_index: int):
+        """Thread that forwards the messages of a shard to the other shards"""
+        ctl = self.shards[shard_index]
+        try:
+            while self.is_online:
+                name, contents, fd = recv_shard_message(ctl)
+                if name == "shard_forward":
+                    target, name, *contents = contents
+                    send_shard_message(self.shards[target], name, shard_index, *contents, fd=fd)
+                if fd is not None:
+                    os.close(fd)
+        except (ConnectionError, OSError):
+            if self.is_online:
+                Server.print_server(f"The shard {shard_index} is closed !")
@@ -0,0 +1,32 @@
+from pyreverb.reverb import *
+
+
+def test_deferred_changes_use_the_equality_of_the_sync_var():
+    """An IDENTITY SyncVar given an equal but other list is notified the same way deferred or not"""
+    calls = []
+    immediate = SyncVar([1], on_changed=[lambda old, new: calls.append("immediate")],
+                        equality=SyncEquality.IDENTITY)
+    deferred = SyncVar([1], on_changed=[lambda old, new: calls.append("deferred")], equality=SyncEquality.IDENTITY)
+
+    immediate.set([1])
+    ReverbManager.DEFER_CHANGES = True
+    try:
+        deferred.set([1])
+        assert calls == ["immediate"]
+        assert ReverbManager.deliver_changes() == 1
+    finally:
+        ReverbManager.DEFER_CHANGES = False
+    assert calls == ["immediate", "deferred"]
+
+
+def test_deferred_change_back_to_the_old_value_is_dropped():
+    calls = []
+    sync_var = SyncVar(1, on_changed=[lambda old, new: calls.append((old, new))])
+    ReverbManager.DEFER_CHANGES = True
+    try:
+        sync_var.set(2)
+        sync_var.set(1)
+        assert ReverbManager.deliver_changes() == 0
+    finally:
+        ReverbManager.DEFER_CHANGES = False
+    assert calls == []
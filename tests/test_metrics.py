@@ -0,0 +1,16 @@
+from pyreverb.reverb_kernel import Metrics
+
+
+def test_count_frame_never_creates_a_connection():
+    m = Metrics()
+    m.count_frame("out", "ping", 10, ("127.0.0.1", 1))
+    assert m.snapshot()["connections"] == {}
+
+    m.add_connection(("127.0.0.1", 1))
+    m.count_frame("in", "ping", 10, ("127.0.0.1", 1))
+    assert m.snapshot()["connections"]["127.0.0.1:1"]["frames_in"] == 1
+
+    m.forget_connection(("127.0.0.1", 1))
+    m.count_frame("out", "server_stop", 10, ("127.0.0.1", 1))  # A send after the disconnection
+    assert m.snapshot()["connections"] == {}
+    assert m.snapshot()["frames"]["server_stop"]["out"]["frames"] == 1
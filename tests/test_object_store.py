@@ -0,0 +1,27 @@
+from pyreverb.reverb import *
+
+
+class Dot(ReverbObject):
+    def __init__(self, x=0, uid="Unknown", belonging_membership=None):
+        self.x = SyncVar(x)
+        super().__init__(self.x, uid=uid, belonging_membership=belonging_membership)
+
+
+def test_store_is_a_mapping_by_uid():
+    store = ReverbObjectStore()
+    a, b = Dot(1, uid="a"), Dot(2, uid="b")
+    a.net_id, b.net_id = 1, 2
+    store.add_many([a, b])
+
+    assert store["a"] is a
+    assert store.get("b") is b
+    assert store.get("c") is None and store.get("c", 5) == 5
+    assert "a" in store and a not in store
+    assert dict(store.items()) == {"a": a, "b": b}
+    assert sorted(store) == ["a", "b"]
+
+    store.remove(a, keep_as_destroyed=True)
+    assert store["a"] == "DESTROYED" and "a" in store
+    assert store.alive_count() == 1 and store.snapshot() == (b,)
+    store.forget(a)
+    assert "a" not in store and len(store) == 1
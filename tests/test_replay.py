@@ -0,0 +1,20 @@
+import warnings
+
+from pyreverb.reverb import *
+from pyreverb.reverb_replay import replay_capture
+
+
+def test_client_replay_handler_can_send(tmp_path):
+    """A replayed handler that sends (here 'handoff' -> 'handoff_ack') goes through the dropped ReplaySocket"""
+    path = str(tmp_path / "client.rvb")
+    capture = PacketCapture(path)
+    capture.write(CAPTURE_IN, 0, Packet.create_packet("handoff"))
+    capture.close()
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        report = replay_capture(path, ReverbSide.CLIENT)
+
+    assert report["frames"] == 1
+    assert not [w for w in caught if "replay" in str(w.message)]
+    assert ReverbManager.REVERB_CONNECTION.frames_out == 1  # The 'handoff_ack'
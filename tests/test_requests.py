@@ -0,0 +1,24 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from pyreverb.reverb import REQUEST_TIMEOUTS
+
+
+def test_request_timeouts_share_one_thread():
+    pending = {i: Future() for i in range(200)}
+    threads = threading.active_count()
+    for request_id in pending:
+        REQUEST_TIMEOUTS.add(pending, request_id, 0.05 + request_id / 10000)
+    assert threading.active_count() <= threads + 1
+
+    futures = list(pending.values())
+    futures[0].cancel()
+    answered = pending.pop(1)  # Answered before its deadline
+    time.sleep(0.3)
+    assert not pending
+    assert futures[0].cancelled() and not answered.done()
+    with pytest.raises(TimeoutError):
+        futures[-1].result(0)
@@ -0,0 +1,33 @@
+import pytest
+
+from pyreverb.reverb import *
+
+
+class Walker(ReverbObject):
+    def __init__(self, uid="Unknown", belonging_membership=None):
+        super().__init__(uid=uid, belonging_membership=belonging_membership)
+
+    @server_rpc
+    def walk(self, dx: float, name: str, path: tuple, run: bool, *steps: int):
+        return dx, name, path, run, steps
+
+
+RPC = ReverbRpc(0, Walker.walk, ReverbSide.SERVER)
+
+
+def test_args_with_the_annotated_types_are_accepted():
+    assert RPC.decode_args([1, "a", [1, 2], True, 3, 4]) == [1.0, "a", (1, 2), True, 3, 4]
+    assert RPC.decode_args([None, "a", None, False]) == [None, "a", None, False]
+
+
+@pytest.mark.parametrize("args", [
+    ["1", "a", [], True],  # str for float
+    [1, 5, [], True],  # int for str
+    [1, "a", "abc", True],  # str for tuple
+    [1, "a", [], 1],  # int for bool
+    [True, "a", [], True],  # bool for float
+    [1, "a", [], True, 2.5],  # float for int
+])
+def test_args_with_another_type_are_rejected(args):
+    with pytest.raises(ReverbRpcArgTypeError):
+        RPC.decode_args(args)